@@ -1,15 +1,35 @@
-from django.contrib import admin
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
 from django.contrib.auth.admin import UserAdmin
+from django.http import Http404, JsonResponse
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
 
-from .models import CustomUser
+from . import bulk, user_state
+from .models import CustomUser, SocialIdentity, Task
+from .serializers import MeSerializer
 # Register your models here.
 
+# Selections larger than this are queued for the run_workers pool instead of running in the request
+BULK_SYNC_LIMIT = getattr(settings, 'BULK_USER_SYNC_LIMIT', 5000)
+
+
+class SocialIdentityInline(admin.TabularInline):
+    model = SocialIdentity
+    extra = 0
+    fields = ('provider', 'subject', 'created_at')
+    readonly_fields = ('created_at',)
+
+
 class CustomUserAdmin(UserAdmin):
     model = CustomUser
+    inlines = (SocialIdentityInline,)
     list_display = ('id', 'email', 'is_staff', 'is_superuser', 'is_active', 'date_joined', 'auth_provider',)
     list_filter = ('is_staff', 'is_rider', 'is_active', 'is_superuser')
     search_fields = ('email',)
     ordering = ('email',)
+    actions = ('deactivate_and_revoke', 'revoke_tokens', 'delete_in_batches')
 
     fieldsets = (
         (None, {'fields': ('email', 'password')}),
@@ -27,4 +47,78 @@ class CustomUserAdmin(UserAdmin):
     search_fields = ('email',)
     ordering = ('email',)
 
-admin.site.register(CustomUser, CustomUserAdmin)
\ No newline at end of file
+    def get_urls(self):
+        return [
+            path(
+                'bulk-jobs/<int:job_id>/',
+                self.admin_site.admin_view(self.bulk_job_status),
+                name='accounts_customuser_bulk_job',
+            ),
+        ] + super().get_urls()
+
+    def bulk_job_status(self, request, job_id):
+        job = bulk.get_job(job_id)
+        if job is None:
+            raise Http404('Unknown bulk job.')
+        return JsonResponse(job)
+
+    def _run_bulk(self, request, queryset, action, verb):
+        # Never let an admin lock themselves out with a select-all
+        user_ids = list(queryset.exclude(pk=request.user.pk).values_list('pk', flat=True))
+        if len(user_ids) > BULK_SYNC_LIMIT:
+            job_id = bulk.start_job(action, user_ids)
+            status_url = reverse('admin:accounts_customuser_bulk_job', args=[job_id])
+            self.message_user(
+                request,
+                f'Queued job {job_id} for {len(user_ids)} users. Progress: {status_url}',
+                messages.INFO,
+            )
+            return
+        count = bulk.ACTIONS[action](user_ids)
+        self.message_user(request, f'{verb} {count} users.', messages.SUCCESS)
+
+    @admin.action(description='Deactivate selected users and revoke their tokens', permissions=['change'])
+    def deactivate_and_revoke(self, request, queryset):
+        self._run_bulk(request, queryset, 'deactivate', 'Deactivated')
+
+    @admin.action(description='Revoke tokens of selected users', permissions=['change'])
+    def revoke_tokens(self, request, queryset):
+        self._run_bulk(request, queryset, 'revoke', 'Revoked tokens for')
+
+    @admin.action(description='Delete selected users in batches', permissions=['delete'])
+    def delete_in_batches(self, request, queryset):
+        if request.POST.get('post'):
+            self._run_bulk(request, queryset, 'delete', 'Deleted')
+            return None
+        # Count-only confirmation: listing every related object is what makes
+        # the stock delete_selected page time out on large selections.
+        context = {
+            **self.admin_site.each_context(request),
+            'title': 'Are you sure?',
+            'opts': self.model._meta,
+            'count': queryset.count(),
+            'queryset': queryset.values_list('pk', flat=True),
+            'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+            'select_across': request.POST.get('select_across'),
+        }
+        return TemplateResponse(request, 'admin/accounts/customuser/delete_in_batches.html', context)
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # Only edits to what /api/me/ returns change its ETag
+        if change and set(form.changed_data) & set(MeSerializer.Meta.fields):
+            user_state.update_profile(obj)
+
+    def delete_queryset(self, request, queryset):
+        bulk.delete_users(queryset.values_list('pk', flat=True))
+
+admin.site.register(CustomUser, CustomUserAdmin)
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'status', 'attempts', 'max_attempts', 'run_at', 'locked_by', 'created_at')
+    list_filter = ('status', 'name')
+    search_fields = ('name', 'idempotency_key')
+    ordering = ('-created_at',)
+    readonly_fields = ('attempts', 'locked_at', 'locked_by', 'last_error', 'progress', 'created_at', 'finished_at')
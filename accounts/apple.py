@@ -1,57 +1,92 @@
 import jwt
 from jwt.algorithms import RSAAlgorithm
-import requests
 import logging
 from django.conf import settings
+from backend.tracing import span
+from . import audiences, precheck
+from .outbound import get_client, ProviderUnavailable
 
 logger = logging.getLogger(__name__)
 
 APPLE_JWKS_URL = 'https://appleid.apple.com/auth/keys'
+APPLE_ISSUER = 'https://appleid.apple.com'
+# Apple signs identity tokens with RS256 only; never trust the token's own `alg`
+ALGORITHMS = ('RS256',)
 
 
 class Apple:
+    @staticmethod
+    def _find_key(jwks, kid):
+        for key in jwks.get('keys', []):
+            if key['kid'] == kid:
+                return RSAAlgorithm.from_jwk(key)
+        return None
+
     @staticmethod
     def get_public_key(kid):
+        client = get_client('apple')
+        url = getattr(settings, 'APPLE_JWKS_URL', APPLE_JWKS_URL)
         try:
-            jwks = requests.get(APPLE_JWKS_URL).json()['keys']
-            for key in jwks:
-                if key['kid'] == kid:
-                    return RSAAlgorithm.from_jwk(key)
-            return None
-        except requests.RequestException as e:
+            with span('apple.fetch_keys', kid=kid):
+                public_key = Apple._find_key(client.get_json(url), kid)
+                if public_key is None and precheck.may_refresh_keys('apple'):
+                    # Apple may have rotated its keys since the cached copy was fetched
+                    public_key = Apple._find_key(client.get_json(url, refresh=True), kid)
+                    if public_key is None:
+                        precheck.remember_unknown_kid('apple', kid)
+            return public_key
+        except ProviderUnavailable as e:
             logger.error(f"Failed to fetch Apple JWKS: {str(e)}")
             return None
 
     @staticmethod
     def validate(id_token):
         try:
-            header = jwt.get_unverified_header(id_token)
-            kid = header.get('kid')
-            alg = header.get('alg')
+            with span('apple.precheck'):
+                header = precheck.precheck(
+                    id_token, issuers=(APPLE_ISSUER,),
+                    audiences=audiences.get_registry().audiences('apple'), algorithms=ALGORITHMS,
+                )
+            kid = header['kid']
+            if precheck.is_unknown_kid('apple', kid):
+                raise precheck.TokenRejected(f"Unknown key ID {kid}")
 
             public_key = Apple.get_public_key(kid)
             if not public_key:
                 raise ValueError("Invalid key ID")
 
-            decoded = jwt.decode(
-                id_token,
-                public_key,
-                algorithms=[alg],
-                audience=settings.APPLE_BUNDLE_ID,
-                issuer='https://appleid.apple.com',
-                options={"require": ["exp", "iss", "aud"]},
-            )
+            with span('apple.verify', alg=header['alg']):
+                decoded = jwt.decode(
+                    id_token,
+                    public_key,
+                    algorithms=ALGORITHMS,
+                    issuer=APPLE_ISSUER,
+                    # Checked below by set membership across every configured bundle ID
+                    options={"require": ["exp", "iss", "aud"], "verify_aud": False},
+                )
+            if audiences.admit('apple', decoded['aud']) is None:
+                raise jwt.InvalidAudienceError(f"Unconfigured audience {decoded['aud']}")
             return {
                 'sub': decoded['sub'],
                 'email': decoded.get('email', ''),
                 'email_verified': decoded.get('email_verified', False),
             }
+        except precheck.TokenRejected as e:
+            # Cheap, possibly flooded path: keep it off the error log
+            logger.info(f"Rejected Apple ID token: {str(e)}")
+            precheck.remember_rejection(id_token)
+            audiences.metrics.record('apple', audiences.UNVERIFIED, 'rejected')
+            return None
         except jwt.ExpiredSignatureError:
             logger.error("Apple ID token expired")
             return None
         except jwt.InvalidTokenError as e:
             logger.error(f"Invalid Apple ID token: {str(e)}")
+            precheck.remember_rejection(id_token)
+            audiences.metrics.record('apple', audiences.UNVERIFIED, 'rejected')
             return None
+        except audiences.BudgetExceeded:
+            raise
         except Exception as e:
             logger.error(f"Apple validation error: {str(e)}")
             return None
\ No newline at end of file
@@ -4,3 +4,20 @@ from django.apps import AppConfig
 class AccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'accounts'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from django.contrib.auth.password_validation import get_default_password_validators
+
+        # Load validator data (e.g. the common-passwords list) at startup rather
+        # than on the first sign-up request.
+        get_default_password_validators()
+
+        # Compile the accepted Google/Apple audiences now so a bad SOCIAL_AUDIENCES fails at startup
+        from . import audiences
+        audiences.get_registry()
+
+        # simplejwt resolves its token backend through this attribute for every token
+        from rest_framework_simplejwt import state
+        from .keyring import KeyRingTokenBackend
+        state.token_backend = KeyRingTokenBackend()
@@ -0,0 +1,168 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+class BudgetExceeded(Exception):
+    """A client app used up its login budget for the current window."""
+
+    def __init__(self, audience, retry_after):
+        super().__init__(f"Login budget of {audience.provider}:{audience.name} exhausted")
+        self.audience = audience
+        self.retry_after = retry_after
+
+
+class Audience:
+    """One client ID (Google) or bundle ID (Apple) that ID tokens may be issued to."""
+
+    __slots__ = ('provider', 'audience', 'name', 'rate', 'period')
+
+    def __init__(self, provider, audience, name=None, rate_limit=None):
+        self.provider = provider
+        self.audience = audience
+        self.name = name or audience
+        self.rate, self.period = self._parse_rate(rate_limit) if rate_limit else (None, None)
+
+    def _parse_rate(self, rate_limit):
+        # Same 'num/period' format as DRF's DEFAULT_THROTTLE_RATES
+        try:
+            num, period = rate_limit.split('/')
+            return int(num), PERIODS[period[0]]
+        except (ValueError, KeyError, IndexError):
+            raise ImproperlyConfigured(
+                f"Invalid rate_limit {rate_limit!r} for {self.provider} audience {self.name}; use e.g. '600/min'"
+            )
+
+    def consume(self):
+        """Count one login against the budget, shared by every process using the cache."""
+        if self.rate is None:
+            return
+        now = time.time()
+        window = int(now // self.period)
+        key = f'accounts:audience-budget:{self.provider}:{self.name}:{window}'
+        cache.add(key, 0, self.period)
+        try:
+            count = cache.incr(key)
+        except ValueError:
+            # The window expired between add() and incr()
+            cache.set(key, 1, self.period)
+            count = 1
+        if count > self.rate:
+            raise BudgetExceeded(self, retry_after=int(self.period - now % self.period) + 1)
+
+
+class AudienceRegistry:
+    """Audiences per provider, compiled into hash lookups once at startup."""
+
+    def __init__(self, config):
+        self._by_provider = {}
+        for provider, entries in config.items():
+            audiences = {}
+            for entry in entries:
+                audience = Audience(provider, **entry)
+                if not audience.audience:
+                    continue
+                if audience.audience in audiences:
+                    raise ImproperlyConfigured(f"Duplicate {provider} audience {audience.audience}")
+                audiences[audience.audience] = audience
+            self._by_provider[provider] = audiences
+        self._sets = {provider: frozenset(audiences) for provider, audiences in self._by_provider.items()}
+
+    def audiences(self, provider):
+        return self._sets.get(provider, frozenset())
+
+    def resolve(self, provider, claim):
+        """The configured Audience an ``aud`` claim (string or list) names, or None."""
+        audiences = self._by_provider.get(provider, {})
+        if isinstance(claim, str):
+            return audiences.get(claim)
+        for value in claim or ():
+            if isinstance(value, str) and value in audiences:
+                return audiences[value]
+        return None
+
+
+# The setting holding each provider's primary audience, and that audience's metrics name
+PRIMARY = {'google': ('GOOGLE_CLIENT_ID', 'web'), 'apple': ('APPLE_BUNDLE_ID', 'ios')}
+
+
+def _config():
+    """Primary audiences from the current settings, plus the ``SOCIAL_AUDIENCES`` extras."""
+    config = {provider: list(entries) for provider, entries in getattr(settings, 'SOCIAL_AUDIENCES', {}).items()}
+    for provider, (setting, name) in PRIMARY.items():
+        entries = config.setdefault(provider, [])
+        primary = getattr(settings, setting, '')
+        if not any(entry.get('audience') == primary for entry in entries):
+            entries.insert(0, {'audience': primary, 'name': name})
+    return config
+
+
+_registry = None
+_lock = threading.Lock()
+
+
+def get_registry():
+    global _registry
+    if _registry is None:
+        with _lock:
+            if _registry is None:
+                _registry = AudienceRegistry(_config())
+    return _registry
+
+
+def reset():
+    global _registry
+    with _lock:
+        _registry = None
+
+
+class AudienceMetrics:
+    """In-process counts of ID-token outcomes per provider and audience."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+
+    def record(self, provider, name, outcome):
+        key = f'{provider}:{name}'
+        with self._lock:
+            counts = self._counters.setdefault(key, {})
+            counts[outcome] = counts.get(outcome, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            return {key: dict(counts) for key, counts in self._counters.items()}
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+
+
+metrics = AudienceMetrics()
+
+
+# Metrics bucket for tokens rejected before their audience could be trusted
+UNVERIFIED = '(unverified)'
+
+
+def admit(provider, claim):
+    """Resolve a verified ``aud`` claim, count the login and charge its budget.
+
+    Returns the Audience, or None if the claim names no configured audience.
+    Raises BudgetExceeded when the audience's ``rate_limit`` is used up.
+    """
+    audience = get_registry().resolve(provider, claim)
+    if audience is None:
+        return None
+    try:
+        audience.consume()
+    except BudgetExceeded:
+        metrics.record(provider, audience.name, 'throttled')
+        raise
+    metrics.record(provider, audience.name, 'verified')
+    return audience
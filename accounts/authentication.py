@@ -0,0 +1,39 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication, JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+
+from . import user_state
+
+
+def issued_before_revocation(token, tokens_valid_after):
+    """True if ``token`` was issued before the user's tokens were revoked (epoch seconds)."""
+    return bool(tokens_valid_after) and token.get('iat', 0) < tokens_valid_after
+
+
+class RevocableJWTAuthentication(JWTAuthentication):
+    """simplejwt's database-backed authentication, also honouring ``tokens_valid_after``."""
+
+    def get_user(self, validated_token):
+        user = super().get_user(validated_token)
+        valid_after = user.tokens_valid_after
+        if valid_after and issued_before_revocation(validated_token, int(valid_after.timestamp())):
+            raise AuthenticationFailed(_("Token has been revoked"), code="token_revoked")
+        return user
+
+
+class CachedStateJWTAuthentication(JWTStatelessUserAuthentication):
+    """Token-only authentication that checks revocation and ``is_active`` against cached user state."""
+
+    def get_user(self, validated_token):
+        user = super().get_user(validated_token)
+        state = user_state.get_or_load_state(validated_token[api_settings.USER_ID_CLAIM])
+        if state is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        if not state['is_active']:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if issued_before_revocation(validated_token, state['tokens_valid_after']):
+            raise AuthenticationFailed(_("Token has been revoked"), code="token_revoked")
+        # Lets the view reuse the state instead of asking the cache again
+        user.cached_state = state
+        return user
@@ -0,0 +1,99 @@
+import datetime
+import logging
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import user_state
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = getattr(settings, 'BULK_USER_CHUNK_SIZE', 1000)
+
+
+def _chunks(user_ids, size):
+    for start in range(0, len(user_ids), size):
+        yield user_ids[start:start + size]
+
+
+def revocation_time():
+    """Next whole second, so every token issued up to now has an earlier `iat`."""
+    now = timezone.now()
+    return now.replace(microsecond=0) + datetime.timedelta(seconds=1)
+
+
+def _run(user_ids, apply, chunk_size=None, progress=None):
+    User = get_user_model()
+    user_ids = list(user_ids)
+    done = 0
+    for chunk in _chunks(user_ids, chunk_size or CHUNK_SIZE):
+        with transaction.atomic():
+            apply(User.objects.filter(pk__in=chunk))
+        user_state.invalidate(*chunk)
+        done += len(chunk)
+        if progress:
+            progress(done, len(user_ids))
+    return done
+
+
+def revoke_tokens(user_ids, chunk_size=None, progress=None):
+    """Reject every JWT issued so far to these users."""
+    valid_after = revocation_time()
+    return _run(
+        user_ids,
+        lambda qs: qs.update(tokens_valid_after=valid_after, profile_version=F('profile_version') + 1),
+        chunk_size, progress,
+    )
+
+
+def deactivate_users(user_ids, chunk_size=None, progress=None):
+    """Deactivate users and revoke their tokens in the same UPDATE."""
+    valid_after = revocation_time()
+    return _run(
+        user_ids,
+        lambda qs: qs.update(
+            is_active=False, tokens_valid_after=valid_after, profile_version=F('profile_version') + 1,
+        ),
+        chunk_size, progress,
+    )
+
+
+def delete_users(user_ids, chunk_size=None, progress=None):
+    """Delete users chunk by chunk; their tokens fail authentication once the rows are gone."""
+    return _run(user_ids, lambda qs: qs.delete(), chunk_size, progress)
+
+
+ACTIONS = {
+    'revoke': revoke_tokens,
+    'deactivate': deactivate_users,
+    'delete': delete_users,
+}
+
+
+def get_job(job_id):
+    """Progress of a background bulk job as a plain dict, or None if unknown."""
+    from .models import Task
+    from .tasks import run_bulk_action
+
+    task_obj = Task.objects.filter(pk=job_id, name=run_bulk_action.task_name).first()
+    if task_obj is None:
+        return None
+    progress = task_obj.progress or {}
+    return {
+        'id': task_obj.pk,
+        'action': task_obj.payload.get('action'),
+        'total': progress.get('total', len(task_obj.payload.get('user_ids', []))),
+        'done': progress.get('done', 0),
+        'status': task_obj.status,
+        'error': task_obj.last_error or None,
+    }
+
+
+def start_job(action, user_ids, chunk_size=None):
+    """Queue a bulk action for the ``run_workers`` pool; returns the job (task) id."""
+    from .tasks import run_bulk_action
+
+    return run_bulk_action.enqueue(action=action, user_ids=list(user_ids), chunk_size=chunk_size).pk
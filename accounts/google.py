@@ -1,26 +1,112 @@
-from google.auth.transport import requests as google_requests
+import json
+from google.auth import exceptions, transport
 from google.oauth2 import id_token
 from django.conf import settings
 import logging
+from backend.tracing import span
+from . import audiences, precheck
+from .outbound import get_client, ProviderUnavailable
 
 logger = logging.getLogger(__name__)
 
+GOOGLE_CERTS_URL = 'https://www.googleapis.com/oauth2/v1/certs'
+GOOGLE_ISSUERS = ('accounts.google.com', 'https://accounts.google.com')
+ALGORITHMS = ('RS256',)
+
+
+class _CachedResponse(transport.Response):
+    def __init__(self, payload):
+        self._data = json.dumps(payload).encode('utf-8')
+
+    @property
+    def status(self):
+        return 200
+
+    @property
+    def headers(self):
+        return {'content-type': 'application/json'}
+
+    @property
+    def data(self):
+        return self._data
+
+
+class ProviderRequest(transport.Request):
+    """google-auth transport that fetches certs through the shared provider client."""
+
+    def __init__(self, client_name='google'):
+        self.client = get_client(client_name)
+
+    def __call__(self, url, method='GET', body=None, headers=None, timeout=None, **kwargs):
+        if method != 'GET':
+            raise exceptions.TransportError(f"Unsupported method {method} for {url}")
+        try:
+            with span('google.fetch_certs'):
+                return _CachedResponse(self.client.get_json(url))
+        except ProviderUnavailable as e:
+            raise exceptions.TransportError(str(e)) from e
+
+
 class Google:
+    @staticmethod
+    def _known_kid(kid):
+        client = get_client('google')
+        url = getattr(settings, 'GOOGLE_CERTS_URL', GOOGLE_CERTS_URL)
+        with span('google.fetch_certs', kid=kid):
+            if kid in client.get_json(url):
+                return True
+            if precheck.may_refresh_keys('google'):
+                # Google may have rotated its certs since the cached copy was fetched
+                if kid in client.get_json(url, refresh=True):
+                    return True
+                precheck.remember_unknown_kid('google', kid)
+        return False
+
     @staticmethod
     def validate(auth_token):
         try:
-            idinfo = id_token.verify_oauth2_token(
-                auth_token, google_requests.Request(), audience=settings.GOOGLE_CLIENT_ID
-            )
-            if idinfo['iss'] not in ['accounts.google.com', 'https://accounts.google.com']:
+            with span('google.precheck'):
+                header = precheck.precheck(
+                    auth_token, issuers=GOOGLE_ISSUERS,
+                    audiences=audiences.get_registry().audiences('google'), algorithms=ALGORITHMS,
+                )
+            kid = header['kid']
+            if precheck.is_unknown_kid('google', kid) or not Google._known_kid(kid):
+                raise precheck.TokenRejected(f"Unknown key ID {kid}")
+
+            with span('google.verify'):
+                idinfo = id_token.verify_token(
+                    auth_token,
+                    ProviderRequest(),
+                    # Checked below by set membership across every configured client ID
+                    audience=None,
+                    certs_url=getattr(settings, 'GOOGLE_CERTS_URL', GOOGLE_CERTS_URL),
+                )
+            if idinfo['iss'] not in GOOGLE_ISSUERS:
                 logger.error(f"Invalid issuer: {idinfo.get('iss')}")
                 return None
+            if audiences.admit('google', idinfo.get('aud')) is None:
+                logger.error(f"Unconfigured audience: {idinfo.get('aud')}")
+                audiences.metrics.record('google', audiences.UNVERIFIED, 'rejected')
+                return None
             return {
                 'sub': idinfo['sub'],
                 'email': idinfo.get('email', ''),
                 'name': idinfo.get('name', ''),
                 'email_verified': idinfo.get('email_verified', False),
+                'picture': idinfo.get('picture', ''),
             }
-        except ValueError as e:
+        except precheck.TokenRejected as e:
+            # Cheap, possibly flooded path: keep it off the error log
+            logger.info(f"Rejected Google ID token: {str(e)}")
+            precheck.remember_rejection(auth_token)
+            audiences.metrics.record('google', audiences.UNVERIFIED, 'rejected')
+            return None
+        except (exceptions.TransportError, ProviderUnavailable) as e:
+            logger.error(f"Failed to fetch Google certs: {str(e)}")
+            return None
+        except (ValueError, exceptions.GoogleAuthError) as e:
             logger.error(f"Token validation failed: {str(e)}")
-            return None
\ No newline at end of file
+            precheck.remember_rejection(auth_token)
+            audiences.metrics.record('google', audiences.UNVERIFIED, 'rejected')
+            return None
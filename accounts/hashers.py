@@ -0,0 +1,43 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+# Below this the hash is too cheap to brute-force offline, whatever the latency target
+MIN_ITERATIONS = 100_000
+
+
+class TunablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """PBKDF2-SHA256 with the work factor taken from ``PASSWORD_HASH_ITERATIONS``.
+
+    It keeps Django's ``pbkdf2_sha256`` algorithm name, so existing hashes verify
+    unchanged. Hashes stored with a different iteration count report
+    ``must_update`` and are re-encoded on the next successful login.
+    """
+
+    @property
+    def iterations(self):
+        return getattr(settings, 'PASSWORD_HASH_ITERATIONS', PBKDF2PasswordHasher.iterations)
+
+
+def time_verify(iterations, samples=5, password='correct horse battery staple'):
+    """Median seconds one password verification takes on this host at ``iterations``."""
+    hasher = TunablePBKDF2PasswordHasher()
+    encoded = hasher.encode(password, hasher.salt(), iterations)
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        hasher.verify(password, encoded)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def recommend_iterations(target_seconds, samples=5, calibration=50_000, step=10_000):
+    """Largest multiple of ``step`` whose verification stays within ``target_seconds``."""
+    per_iteration = time_verify(calibration, samples) / calibration
+    iterations = max(step, int(target_seconds / per_iteration) // step * step)
+    # PBKDF2 cost is linear, but confirm against a real measurement at the chosen count
+    while iterations > step and time_verify(iterations, samples) > target_seconds:
+        iterations = max(step, iterations * 19 // 20 // step * step)
+    return iterations
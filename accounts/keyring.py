@@ -0,0 +1,274 @@
+import hashlib
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+
+import jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from jwt.algorithms import ECAlgorithm, RSAAlgorithm
+from rest_framework_simplejwt.backends import TokenBackend
+from rest_framework_simplejwt.exceptions import TokenBackendError, TokenBackendExpiredToken
+from rest_framework_simplejwt.settings import api_settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    # Holds keys.json plus one <kid>.pem per key; mount it from your secret store in production
+    'DIRECTORY': None,
+    'ALGORITHM': 'ES256',
+    'ROTATION_INTERVAL': 30 * 24 * 3600,
+    # New keys appear in the JWKS this long before they sign anything; keep it above JWKS_MAX_AGE
+    'PUBLISH_AHEAD': 2 * 24 * 3600,
+    'JWKS_MAX_AGE': 24 * 3600,
+    # Accept kid-less HS256 tokens signed with SECRET_KEY; turn off one refresh lifetime after the switch
+    'ACCEPT_LEGACY_HS256': True,
+    'CHECK_INTERVAL': 1,
+}
+
+ALGORITHMS = ('RS256', 'ES256')
+MANIFEST = 'keys.json'
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'JWT_KEY_RING', {})}
+
+
+def _directory():
+    directory = get_config()['DIRECTORY']
+    return str(directory) if directory else None
+
+
+class SigningKey:
+    __slots__ = ('kid', 'algorithm', 'activates_at', 'expires_at', 'private_key', 'public_key')
+
+    def __init__(self, kid, algorithm, activates_at, expires_at, private_key):
+        self.kid = kid
+        self.algorithm = algorithm
+        self.activates_at = activates_at
+        self.expires_at = expires_at
+        self.private_key = private_key
+        self.public_key = private_key.public_key()
+
+    def to_jwk(self):
+        codec = RSAAlgorithm if self.algorithm == 'RS256' else ECAlgorithm
+        jwk = codec.to_jwk(self.public_key, as_dict=True)
+        jwk.update({'kid': self.kid, 'alg': self.algorithm, 'use': 'sig'})
+        return jwk
+
+
+class KeyRing:
+    """The keys in one version of the key directory, with the JWKS document pre-rendered."""
+
+    def __init__(self, keys):
+        self.keys = {key.kid: key for key in keys}
+        # Newest activation first, so the signer is the first key already active
+        self._by_activation = sorted(keys, key=lambda key: key.activates_at, reverse=True)
+        self.jwks = json.dumps(
+            {'keys': [key.to_jwk() for key in self._by_activation]}, separators=(',', ':'),
+        ).encode()
+        self.etag = f'"{hashlib.sha256(self.jwks).hexdigest()[:32]}"'
+
+    def signing_key(self, now=None):
+        now = time.time() if now is None else now
+        for key in self._by_activation:
+            if key.activates_at <= now:
+                return key
+        return None
+
+
+EMPTY_RING = KeyRing([])
+
+_lock = threading.Lock()
+_ring = EMPTY_RING
+_loaded_from = None
+_checked_at = 0.0
+
+
+def _read_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST)) as f:
+            return json.load(f)['keys']
+    except FileNotFoundError:
+        return []
+
+
+def _load(directory):
+    now = time.time()
+    keys = []
+    for entry in _read_manifest(directory):
+        if entry['expires_at'] is not None and entry['expires_at'] <= now:
+            continue
+        with open(os.path.join(directory, f"{entry['kid']}.pem"), 'rb') as f:
+            private_key = serialization.load_pem_private_key(f.read(), password=None)
+        keys.append(SigningKey(entry['kid'], entry['alg'], entry['activates_at'], entry['expires_at'], private_key))
+    return KeyRing(keys)
+
+
+def get_ring():
+    """Current key ring, re-read when the manifest changes (checked every ``CHECK_INTERVAL`` seconds)."""
+    global _ring, _loaded_from, _checked_at
+    directory = _directory()
+    if directory is None:
+        return EMPTY_RING
+    now = time.monotonic()
+    if _loaded_from is not None and _loaded_from[0] == directory and now - _checked_at < get_config()['CHECK_INTERVAL']:
+        return _ring
+    with _lock:
+        try:
+            version = (directory, os.stat(os.path.join(directory, MANIFEST)).st_mtime_ns)
+        except FileNotFoundError:
+            version = (directory, None)
+        if version != _loaded_from:
+            _ring = _load(directory)
+            _loaded_from = version
+            logger.info(f"Loaded JWT key ring from {directory}: {', '.join(_ring.keys) or 'no keys'}")
+        _checked_at = now
+        return _ring
+
+
+def reset():
+    """Forget the loaded ring so the next call re-reads the directory."""
+    global _ring, _loaded_from, _checked_at
+    with _lock:
+        _ring, _loaded_from, _checked_at = EMPTY_RING, None, 0.0
+
+
+def _generate(algorithm):
+    if algorithm == 'RS256':
+        return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    if algorithm == 'ES256':
+        return ec.generate_private_key(ec.SECP256R1())
+    raise ValueError(f"Unsupported signing algorithm {algorithm}; choose from {', '.join(ALGORITHMS)}")
+
+
+def _write_key(directory, kid, private_key):
+    path = os.path.join(directory, f'{kid}.pem')
+    pem = private_key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption(),
+    )
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(pem)
+
+
+def _write_manifest(directory, entries):
+    path = os.path.join(directory, MANIFEST)
+    with open(f'{path}.tmp', 'w') as f:
+        json.dump({'keys': entries}, f, indent=2)
+    # Readers either see the old manifest or the new one, never a partial write
+    os.replace(f'{path}.tmp', path)
+
+
+def rotate(algorithm=None, force=False, immediate=False, now=None):
+    """Advance the key schedule; meant to run daily from cron.
+
+    Creates the first key (active at once) when the ring is empty, and a
+    successor published ``PUBLISH_AHEAD`` before it starts signing once the
+    current key is due. Replaced keys stay verifiable until every token they
+    signed has expired, then are deleted. Returns ``(created_kid, removed_kids)``.
+    """
+    conf = get_config()
+    directory = _directory()
+    if directory is None:
+        raise ValueError('JWT_KEY_RING["DIRECTORY"] is not configured.')
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    now = int(time.time() if now is None else now)
+    algorithm = algorithm or conf['ALGORITHM']
+
+    entries = _read_manifest(directory)
+    removed = [e['kid'] for e in entries if e['expires_at'] is not None and e['expires_at'] <= now]
+    entries = [e for e in entries if e['kid'] not in removed]
+    active = [e for e in entries if e['activates_at'] <= now]
+    current = max(active, key=lambda e: e['activates_at'], default=None)
+    pending = [e for e in entries if e['activates_at'] > now]
+
+    due = current is None or now - current['activates_at'] >= conf['ROTATION_INTERVAL'] - conf['PUBLISH_AHEAD']
+    created = None
+    if force or current is None or (due and not pending):
+        activates_at = now if current is None or immediate else now + conf['PUBLISH_AHEAD']
+        # A superseded pending key never signed anything and can go right away
+        removed += [e['kid'] for e in pending]
+        entries = [e for e in entries if e['activates_at'] <= now]
+        lifetime = int(api_settings.REFRESH_TOKEN_LIFETIME.total_seconds())
+        for entry in entries:
+            if entry['expires_at'] is None:
+                entry['expires_at'] = activates_at + lifetime
+        created = f'{time.strftime("%Y%m%d", time.gmtime(now))}-{secrets.token_hex(4)}'
+        _write_key(directory, created, _generate(algorithm))
+        entries.append({'kid': created, 'alg': algorithm, 'activates_at': activates_at, 'expires_at': None})
+
+    if created or removed:
+        _write_manifest(directory, entries)
+        for kid in removed:
+            try:
+                os.remove(os.path.join(directory, f'{kid}.pem'))
+            except FileNotFoundError:
+                pass
+    return created, removed
+
+
+class KeyRingTokenBackend(TokenBackend):
+    """simplejwt token backend that signs with the key ring and verifies by ``kid``.
+
+    With an empty ring it behaves exactly like the stock HS256 backend.
+    """
+
+    def __init__(self):
+        super().__init__(
+            api_settings.ALGORITHM,
+            api_settings.SIGNING_KEY,
+            api_settings.VERIFYING_KEY,
+            api_settings.AUDIENCE,
+            api_settings.ISSUER,
+            None,
+            api_settings.LEEWAY,
+            api_settings.JSON_ENCODER,
+        )
+
+    def encode(self, payload):
+        key = get_ring().signing_key()
+        if key is None:
+            return super().encode(payload)
+        jwt_payload = payload.copy()
+        if self.audience is not None:
+            jwt_payload['aud'] = self.audience
+        if self.issuer is not None:
+            jwt_payload['iss'] = self.issuer
+        return jwt.encode(
+            jwt_payload, key.private_key, algorithm=key.algorithm,
+            headers={'kid': key.kid}, json_encoder=self.json_encoder,
+        )
+
+    def decode(self, token, verify=True):
+        try:
+            kid = jwt.get_unverified_header(token).get('kid')
+        except jwt.InvalidTokenError as e:
+            raise TokenBackendError(_("Token is invalid")) from e
+        ring = get_ring()
+        if kid is None:
+            if ring.keys and not get_config()['ACCEPT_LEGACY_HS256']:
+                raise TokenBackendError(_("Token is invalid"))
+            return super().decode(token, verify)
+        key = ring.keys.get(kid)
+        if key is None:
+            raise TokenBackendError(_("Token is invalid"))
+        try:
+            return jwt.decode(
+                token,
+                key.public_key,
+                algorithms=[key.algorithm],
+                audience=self.audience,
+                issuer=self.issuer,
+                leeway=self.get_leeway(),
+                options={'verify_aud': self.audience is not None, 'verify_signature': verify},
+            )
+        except jwt.ExpiredSignatureError as e:
+            raise TokenBackendExpiredToken(_("Token is expired")) from e
+        except jwt.InvalidTokenError as e:
+            raise TokenBackendError(_("Token is invalid")) from e
@@ -0,0 +1,388 @@
+import asyncio
+import datetime
+import hashlib
+import json
+import random
+import secrets
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import jwt
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from jwt.algorithms import RSAAlgorithm
+
+SCENARIOS = ('signup', 'login', 'google', 'apple', 'refresh', 'authed')
+
+GOOGLE_ISSUER = 'https://accounts.google.com'
+APPLE_ISSUER = 'https://appleid.apple.com'
+
+
+class FakeIssuer:
+    """Mints Google/Apple-shaped ID tokens and serves the matching key sets.
+
+    The signing key is kept on disk so that a server which has cached the key
+    set from a previous run keeps trusting tokens from the next one.
+    """
+
+    def __init__(self, key_path, host='127.0.0.1', port=8765):
+        self.private_key = self._load_key(key_path)
+        public_der = self.private_key.public_key().public_bytes(
+            serialization.Encoding.DER, serialization.PublicFormat.SubjectPublicKeyInfo
+        )
+        self.kid = hashlib.sha256(public_der).hexdigest()[:16]
+        self.host = host
+        self.port = port
+        self._server = None
+
+    @staticmethod
+    def _load_key(key_path):
+        try:
+            with open(key_path, 'rb') as f:
+                return serialization.load_pem_private_key(f.read(), password=None)
+        except FileNotFoundError:
+            key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+            with open(key_path, 'wb') as f:
+                f.write(key.private_bytes(
+                    serialization.Encoding.PEM,
+                    serialization.PrivateFormat.PKCS8,
+                    serialization.NoEncryption(),
+                ))
+            return key
+
+    @property
+    def google_certs_url(self):
+        return f'http://{self.host}:{self.port}/google/certs'
+
+    @property
+    def apple_jwks_url(self):
+        return f'http://{self.host}:{self.port}/apple/keys'
+
+    def google_certs(self):
+        name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, 'loadtest-issuer')])
+        now = datetime.datetime.now(datetime.timezone.utc)
+        cert = (
+            x509.CertificateBuilder()
+            .subject_name(name)
+            .issuer_name(name)
+            .public_key(self.private_key.public_key())
+            .serial_number(int(self.kid, 16))
+            .not_valid_before(now - datetime.timedelta(days=1))
+            .not_valid_after(now + datetime.timedelta(days=365))
+            .sign(self.private_key, hashes.SHA256())
+        )
+        return {self.kid: cert.public_bytes(serialization.Encoding.PEM).decode()}
+
+    def apple_jwks(self):
+        jwk = json.loads(RSAAlgorithm.to_jwk(self.private_key.public_key()))
+        jwk.update({'kid': self.kid, 'alg': 'RS256', 'use': 'sig'})
+        return {'keys': [jwk]}
+
+    def mint(self, provider, audience, sub, email, name=''):
+        now = int(time.time())
+        claims = {
+            'iss': GOOGLE_ISSUER if provider == 'google' else APPLE_ISSUER,
+            'aud': audience,
+            'sub': sub,
+            'email': email,
+            'email_verified': True,
+            'iat': now,
+            'exp': now + 600,
+        }
+        if provider == 'google':
+            claims['name'] = name
+        return jwt.encode(claims, self.private_key, algorithm='RS256', headers={'kid': self.kid})
+
+    def start(self):
+        documents = {
+            '/google/certs': json.dumps(self.google_certs()).encode(),
+            '/apple/keys': json.dumps(self.apple_jwks()).encode(),
+        }
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = documents.get(self.path)
+                self.send_response(200 if body else 404)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body or b'')))
+                self.end_headers()
+                self.wfile.write(body or b'')
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+class HTTPConnection:
+    """Minimal keep-alive HTTP/1.1 client for one virtual user."""
+
+    def __init__(self, host, port, timeout):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self._reader = None
+        self._writer = None
+
+    async def close(self):
+        if self._writer:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+        self._reader = self._writer = None
+
+    async def request(self, method, path, payload=None, token=None):
+        try:
+            return await asyncio.wait_for(self._request(method, path, payload, token), self.timeout)
+        except (asyncio.TimeoutError, ConnectionError, OSError, asyncio.IncompleteReadError):
+            await self.close()
+            raise
+
+    async def _request(self, method, path, payload, token):
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        body = json.dumps(payload).encode() if payload is not None else b''
+        headers = [
+            f'{method} {path} HTTP/1.1',
+            f'Host: {self.host}:{self.port}',
+            'Accept: application/json',
+            'Connection: keep-alive',
+            f'Content-Length: {len(body)}',
+        ]
+        if payload is not None:
+            headers.append('Content-Type: application/json')
+        if token:
+            headers.append(f'Authorization: Bearer {token}')
+        self._writer.write(('\r\n'.join(headers) + '\r\n\r\n').encode() + body)
+        await self._writer.drain()
+
+        status_line = await self._reader.readline()
+        if not status_line:
+            raise ConnectionError('connection closed by server')
+        version, status = status_line.decode().split(' ', 2)[:2]
+        response_headers = {}
+        while True:
+            line = await self._reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode().partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+
+        if 'content-length' in response_headers:
+            data = await self._reader.readexactly(int(response_headers['content-length']))
+        elif response_headers.get('transfer-encoding') == 'chunked':
+            data = b''
+            while True:
+                size = int((await self._reader.readline()).strip(), 16)
+                chunk = await self._reader.readexactly(size + 2)
+                if size == 0:
+                    break
+                data += chunk[:-2]
+        else:
+            data = await self._reader.read()
+            response_headers['connection'] = 'close'
+
+        if version == 'HTTP/1.0' or response_headers.get('connection', '').lower() == 'close':
+            await self.close()
+        try:
+            body = json.loads(data) if data else {}
+        except ValueError:
+            body = {}
+        return int(status), body
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, scenario, latency, ok):
+        self.latencies[scenario].append(latency)
+        if not ok:
+            self.errors[scenario] += 1
+
+    def merged(self):
+        return sorted(latency for values in self.latencies.values() for latency in values)
+
+    @property
+    def total(self):
+        return sum(len(values) for values in self.latencies.values())
+
+    @property
+    def total_errors(self):
+        return sum(self.errors.values())
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(latencies, errors):
+    values = sorted(latencies)
+    return {
+        'requests': len(values),
+        'errors': errors,
+        'error_rate': errors / len(values) if values else 0.0,
+        'p50_ms': percentile(values, 50) * 1000,
+        'p90_ms': percentile(values, 90) * 1000,
+        'p99_ms': percentile(values, 99) * 1000,
+        'max_ms': (values[-1] if values else 0.0) * 1000,
+    }
+
+
+class VirtualUser:
+    def __init__(self, runner, index):
+        self.runner = runner
+        self.index = index
+        self.conn = HTTPConnection(runner.host, runner.port, runner.timeout)
+        tag = f'{runner.run_id}-{index}'
+        self.email = f'lt-{tag}@loadtest.invalid'
+        self.password = f'Lt-{secrets.token_urlsafe(12)}'
+        self.google_sub = f'g-{tag}'
+        self.apple_sub = f'a-{tag}'
+        self.access = None
+        self.refresh = None
+        self.signups = 0
+
+    def _keep_tokens(self, body):
+        data = body.get('data', body)
+        self.access = data.get('access', self.access)
+        self.refresh = data.get('refresh', self.refresh)
+
+    async def setup(self):
+        status, body = await self.conn.request('POST', '/api/auth/signup/', {
+            'email': self.email,
+            'password': self.password,
+            'password2': self.password,
+            'name': f'Load Test {self.index}',
+        })
+        if status >= 400:
+            raise RuntimeError(f'Could not create load-test user {self.email}: {status} {body}')
+        self._keep_tokens(body)
+
+    async def signup(self):
+        self.signups += 1
+        email = f'lt-{self.runner.run_id}-{self.index}-{self.signups}@loadtest.invalid'
+        return await self.conn.request('POST', '/api/auth/signup/', {
+            'email': email, 'password': self.password, 'password2': self.password,
+        })
+
+    async def login(self):
+        return await self.conn.request('POST', '/api/auth/login/', {
+            'email': self.email, 'password': self.password,
+        })
+
+    async def google(self):
+        token = self.runner.issuer.mint(
+            'google', self.runner.google_audience, self.google_sub,
+            f'{self.google_sub}@loadtest.invalid', name=f'Google {self.index}',
+        )
+        return await self.conn.request('POST', '/api/auth/google/', {'auth_token': token})
+
+    async def apple(self):
+        token = self.runner.issuer.mint(
+            'apple', self.runner.apple_audience, self.apple_sub, f'{self.apple_sub}@loadtest.invalid',
+        )
+        return await self.conn.request('POST', '/api/auth/apple/', {'auth_token': token})
+
+    async def refresh_token(self):
+        return await self.conn.request('POST', '/api/auth/refresh/', {'refresh': self.refresh})
+
+    async def authed(self):
+        return await self.conn.request('GET', self.runner.auth_path, token=self.access)
+
+    async def run(self, deadline, stats):
+        actions = {
+            'signup': self.signup,
+            'login': self.login,
+            'google': self.google,
+            'apple': self.apple,
+            'refresh': self.refresh_token,
+            'authed': self.authed,
+        }
+        scenarios, weights = zip(*self.runner.mix.items())
+        while time.perf_counter() < deadline:
+            scenario = random.choices(scenarios, weights)[0]
+            start = time.perf_counter()
+            try:
+                status, body = await actions[scenario]()
+                ok = status < 400
+                if ok and scenario in ('login', 'refresh'):
+                    self._keep_tokens(body)
+            except (asyncio.TimeoutError, ConnectionError, OSError, ValueError, asyncio.IncompleteReadError):
+                ok = False
+            stats.record(scenario, time.perf_counter() - start, ok)
+        await self.conn.close()
+
+
+class LoadTest:
+    def __init__(self, url, issuer, mix, google_audience, apple_audience,
+                 auth_path='/api/me/', timeout=30):
+        parts = urlsplit(url)
+        self.host = parts.hostname or '127.0.0.1'
+        self.port = parts.port or 80
+        self.issuer = issuer
+        self.mix = {name: weight for name, weight in mix.items() if weight > 0}
+        self.google_audience = google_audience
+        self.apple_audience = apple_audience
+        self.auth_path = auth_path
+        self.timeout = timeout
+        self.run_id = secrets.token_hex(4)
+        self._next_user = 0
+
+    async def step(self, concurrency, duration):
+        users = [VirtualUser(self, self._next_user + i) for i in range(concurrency)]
+        self._next_user += concurrency
+        # Accounts are created before the clock starts so setup cost is not measured
+        await asyncio.gather(*(user.setup() for user in users))
+        stats = Stats()
+        start = time.perf_counter()
+        deadline = start + duration
+        await asyncio.gather(*(user.run(deadline, stats) for user in users))
+        elapsed = time.perf_counter() - start
+        result = summarize(stats.merged(), stats.total_errors)
+        result.update({
+            'concurrency': concurrency,
+            'throughput': stats.total / elapsed if elapsed else 0.0,
+            'scenarios': {
+                name: summarize(stats.latencies[name], stats.errors[name])
+                for name in sorted(stats.latencies)
+            },
+        })
+        return result
+
+    def ramp(self, levels, duration, max_error_rate=None, on_step=None):
+        results = []
+        for concurrency in levels:
+            result = asyncio.run(self.step(concurrency, duration))
+            results.append(result)
+            if on_step:
+                on_step(result)
+            if max_error_rate is not None and result['error_rate'] > max_error_rate:
+                break
+        return results
+
+
+def saturation_point(results, min_gain=0.1):
+    """Return the first concurrency level whose throughput gain fell below ``min_gain``."""
+    for previous, current in zip(results, results[1:]):
+        if previous['throughput'] and current['throughput'] < previous['throughput'] * (1 + min_gain):
+            return previous['concurrency']
+    return None
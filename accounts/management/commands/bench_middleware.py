@@ -0,0 +1,56 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.http import JsonResponse
+from django.test import RequestFactory
+from django.views.decorators.csrf import csrf_exempt
+
+from backend.middleware import MiddlewareChain
+
+
+class Command(BaseCommand):
+    help = "Measure per-request middleware overhead of the full stack versus the lean API chain."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20000, help='Requests per chain')
+        parser.add_argument('--path', default='/api/auth/refresh/', help='Request path to simulate')
+
+    def handle(self, *args, **options):
+        factory = RequestFactory()
+        count = options['requests']
+        host = next((h for h in settings.ALLOWED_HOSTS if '*' not in h), 'localhost').lstrip('.')
+
+        @csrf_exempt  # as every DRF APIView is
+        def view(request):
+            return JsonResponse({'ok': True})
+
+        results = {}
+        for label, paths in (('full (before)', settings.DEFAULT_MIDDLEWARE), ('api (after)', settings.API_MIDDLEWARE)):
+            chain = None
+
+            def get_response(request):
+                # Mirror BaseHandler._get_response: view hooks run before the view
+                for process_view in chain.view_middleware:
+                    response = process_view(request, view, (), {})
+                    if response is not None:
+                        return response
+                return view(request)
+
+            chain = MiddlewareChain(paths, get_response)
+            requests = [
+                factory.post(
+                    options['path'], data='{}', content_type='application/json',
+                    HTTP_HOST=host, HTTP_AUTHORIZATION='Bearer x', HTTP_COOKIE='sessionid=abc; csrftoken=def',
+                )
+                for _ in range(count)
+            ]
+            start = time.perf_counter()
+            for request in requests:
+                chain(request)
+            results[label] = (time.perf_counter() - start) / count * 1e6
+
+        for label, usec in results.items():
+            self.stdout.write(f'{label:<14} {usec:8.1f} us/request')
+        full, api = results.values()
+        self.stdout.write(self.style.SUCCESS(f'Saved {full - api:.1f} us/request ({1 - api / full:.0%}).'))
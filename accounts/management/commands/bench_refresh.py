@@ -0,0 +1,67 @@
+import json
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.views import TokenRefreshView
+
+from accounts import user_state
+from accounts.views import RevocableTokenRefreshView
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Measure auth/refresh/ against simplejwt's stock TokenRefreshView."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=5000, help='Refreshes per view')
+
+    def handle(self, *args, **options):
+        try:
+            # The benchmark user never outlives the run
+            with transaction.atomic():
+                self._run(options['requests'])
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _run(self, count):
+        factory = RequestFactory()
+        host = next((h for h in settings.ALLOWED_HOSTS if '*' not in h), 'localhost').lstrip('.')
+        user = get_user_model().objects.create_user(email='bench-refresh@example.invalid')
+        body = json.dumps({'refresh': str(RefreshToken.for_user(user))})
+
+        def refresh(view):
+            request = factory.post('/api/auth/refresh/', data=body, content_type='application/json', HTTP_HOST=host)
+            response = view(request)
+            response.render()
+            assert response.status_code == 200, response.content
+            return response
+
+        results = {}
+        views = (
+            ('stock (before)', TokenRefreshView.as_view()),
+            ('cached (after)', RevocableTokenRefreshView.as_view()),
+        )
+        for label, view in views:
+            refresh(view)  # warm the user-state cache and any lazy imports
+            with CaptureQueriesContext(connection) as queries:
+                refresh(view)
+            start = time.perf_counter()
+            for _ in range(count):
+                refresh(view)
+            results[label] = ((time.perf_counter() - start) / count * 1e6, len(queries))
+        user_state.invalidate(user.pk)
+
+        for label, (usec, queries) in results.items():
+            self.stdout.write(f'{label:<15} {usec:8.1f} us/request {queries:3d} queries/request')
+        (before, _), (after, _) = results.values()
+        self.stdout.write(self.style.SUCCESS(f'Saved {before - after:.1f} us/request ({1 - after / before:.0%}).'))
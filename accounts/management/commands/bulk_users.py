@@ -0,0 +1,60 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts import bulk
+
+
+class Command(BaseCommand):
+    help = (
+        "Deactivate, delete or revoke the tokens of many users in chunked UPDATE/DELETE "
+        "batches. Deactivation and deletion also revoke outstanding JWTs."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=sorted(bulk.ACTIONS))
+        parser.add_argument('--ids', help='Comma-separated user ids')
+        parser.add_argument('--ids-file', help='File with one user id per line')
+        parser.add_argument('--email-domain', help='Select every user whose email ends with @<domain>')
+        parser.add_argument('--chunk-size', type=int, default=bulk.CHUNK_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many users match')
+        parser.add_argument('--yes', action='store_true', help='Do not ask for confirmation before deleting')
+
+    def _user_ids(self, options):
+        User = get_user_model()
+        queryset = User.objects.all()
+        selected = False
+        ids = []
+        if options['ids']:
+            ids += [value.strip() for value in options['ids'].split(',') if value.strip()]
+        if options['ids_file']:
+            with open(options['ids_file']) as f:
+                ids += [line.strip() for line in f if line.strip()]
+        if ids:
+            try:
+                queryset = queryset.filter(pk__in=[int(value) for value in ids])
+            except ValueError:
+                raise CommandError('User ids must be integers.')
+            selected = True
+        if options['email_domain']:
+            queryset = queryset.filter(email__iendswith=f"@{options['email_domain'].lstrip('@')}")
+            selected = True
+        if not selected:
+            raise CommandError('Select users with --ids, --ids-file and/or --email-domain.')
+        return list(queryset.exclude(is_superuser=True).order_by('pk').values_list('pk', flat=True))
+
+    def handle(self, *args, **options):
+        action = options['action']
+        user_ids = self._user_ids(options)
+        self.stdout.write(f'{len(user_ids)} users selected for {action} (superusers are never included).')
+        if options['dry_run'] or not user_ids:
+            return
+        if action == 'delete' and not options['yes']:
+            answer = input(f'Permanently delete {len(user_ids)} users? [y/N] ')
+            if answer.strip().lower() != 'y':
+                raise CommandError('Aborted.')
+
+        def progress(done, total):
+            self.stdout.write(f'  {done}/{total} ({done / total:.0%})')
+
+        count = bulk.ACTIONS[action](user_ids, options['chunk_size'], progress)
+        self.stdout.write(self.style.SUCCESS(f'{action.capitalize()} finished for {count} users.'))
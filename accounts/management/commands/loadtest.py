@@ -0,0 +1,104 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.loadtest import SCENARIOS, FakeIssuer, LoadTest, saturation_point
+
+DEFAULT_MIX = 'signup=1,login=3,google=2,apple=1,refresh=4,authed=9'
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise CommandError(f"Unknown scenario '{name}'. Choose from: {', '.join(SCENARIOS)}")
+        try:
+            mix[name] = float(weight or 1)
+        except ValueError:
+            raise CommandError(f"Invalid weight for '{name}': {weight}")
+    if not any(mix.values()):
+        raise CommandError('The traffic mix needs at least one scenario with a positive weight.')
+    return mix
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive a running instance (runserver, WSGI or ASGI) with a mix of sign-up, login, "
+        "Google/Apple login, refresh and authenticated calls while ramping concurrency."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Base URL of the server under test')
+        parser.add_argument('--concurrency', default='1,2,4,8,16,32',
+                            help='Comma-separated concurrency levels to ramp through')
+        parser.add_argument('--duration', type=float, default=10, help='Seconds to run each concurrency level')
+        parser.add_argument('--mix', default=DEFAULT_MIX, help='Scenario weights, e.g. login=3,refresh=4')
+        parser.add_argument('--auth-path', default='/api/me/',
+                            help='Path requested with the access token for the "authed" scenario')
+        parser.add_argument('--timeout', type=float, default=30, help='Per-request timeout in seconds')
+        parser.add_argument('--max-error-rate', type=float, default=0.5,
+                            help='Stop ramping once a level exceeds this error rate')
+        parser.add_argument('--issuer-port', type=int, default=8765, help='Port for the embedded fake issuer')
+        parser.add_argument('--issuer-key', default=str(settings.BASE_DIR / '.loadtest-issuer.pem'),
+                            help='PEM file holding the fake issuer signing key (created if missing)')
+        parser.add_argument('--json', action='store_true', help='Print results as JSON')
+
+    def handle(self, *args, **options):
+        try:
+            levels = [int(level) for level in options['concurrency'].split(',')]
+        except ValueError:
+            raise CommandError('--concurrency must be a comma-separated list of integers.')
+        mix = parse_mix(options['mix'])
+
+        issuer = FakeIssuer(options['issuer_key'], port=options['issuer_port'])
+        issuer.start()
+        if mix.get('google') or mix.get('apple'):
+            self.stderr.write(
+                'Social logins need the server to trust the fake issuer. Start it with:\n'
+                f'  GOOGLE_CERTS_URL={issuer.google_certs_url} APPLE_JWKS_URL={issuer.apple_jwks_url}\n'
+            )
+
+        loadtest = LoadTest(
+            options['url'], issuer, mix,
+            google_audience=settings.GOOGLE_CLIENT_ID,
+            apple_audience=settings.APPLE_BUNDLE_ID,
+            auth_path=options['auth_path'],
+            timeout=options['timeout'],
+        )
+        if not options['json']:
+            self.stdout.write(f"{'conc':>5} {'req/s':>9} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'errors':>8}")
+        try:
+            results = loadtest.ramp(
+                levels, options['duration'], options['max_error_rate'],
+                on_step=None if options['json'] else self._print_step,
+            )
+        except (OSError, RuntimeError) as e:
+            raise CommandError(f'Load test aborted: {e}')
+        finally:
+            issuer.stop()
+
+        knee = saturation_point(results)
+        if options['json']:
+            self.stdout.write(json.dumps({'steps': results, 'saturation_concurrency': knee}, indent=2))
+            return
+        self.stdout.write('')
+        for result in results[-1:]:
+            self.stdout.write(f"Per-scenario at concurrency {result['concurrency']}:")
+            for name, summary in result['scenarios'].items():
+                self.stdout.write(
+                    f"  {name:<8} n={summary['requests']:<6} p50={summary['p50_ms']:.1f}ms "
+                    f"p99={summary['p99_ms']:.1f}ms errors={summary['error_rate']:.1%}"
+                )
+        if knee:
+            self.stdout.write(self.style.WARNING(f'Throughput saturates at concurrency {knee}.'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Throughput still scaling at the highest level tested.'))
+
+    def _print_step(self, result):
+        self.stdout.write(
+            f"{result['concurrency']:>5} {result['throughput']:>9.1f} {result['p50_ms']:>9.1f} "
+            f"{result['p90_ms']:>9.1f} {result['p99_ms']:>9.1f} {result['error_rate']:>8.1%}"
+        )
@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts import keyring
+
+
+def _when(epoch):
+    return 'never' if epoch is None else time.strftime('%Y-%m-%d %H:%M:%SZ', time.gmtime(epoch))
+
+
+class Command(BaseCommand):
+    help = (
+        "Advance the JWT signing-key schedule: create the first key, publish a successor ahead of "
+        "rotation and delete keys whose tokens have all expired. Run it daily from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--algorithm', choices=keyring.ALGORITHMS,
+                            help='Algorithm for a new key (default: JWT_KEY_RING["ALGORITHM"])')
+        parser.add_argument('--force', action='store_true', help='Create a successor even if rotation is not due')
+        parser.add_argument('--immediate', action='store_true',
+                            help='Sign with the new key at once instead of after PUBLISH_AHEAD; '
+                                 'verifiers with a cached JWKS will reject its tokens until they refetch')
+        parser.add_argument('--list', action='store_true', help='Only show the key ring')
+
+    def handle(self, *args, **options):
+        if not options['list']:
+            try:
+                created, removed = keyring.rotate(
+                    options['algorithm'], force=options['force'], immediate=options['immediate'],
+                )
+            except ValueError as e:
+                raise CommandError(str(e))
+            for kid in removed:
+                self.stdout.write(f'Removed key {kid}.')
+            if created:
+                self.stdout.write(self.style.SUCCESS(f'Created key {created}.'))
+            else:
+                self.stdout.write('Rotation not due.')
+
+        keyring.reset()
+        ring = keyring.get_ring()
+        signer = ring.signing_key()
+        self.stdout.write(f"{'kid':<18} {'alg':<6} {'signs from':<21} expires")
+        for key in sorted(ring.keys.values(), key=lambda key: key.activates_at):
+            row = f'{key.kid:<18} {key.algorithm:<6} {_when(key.activates_at):<21} {_when(key.expires_at)}'
+            self.stdout.write(f'{row:<70} <- signing' if key is signer else row)
@@ -0,0 +1,52 @@
+import multiprocessing
+import signal
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+def start_worker(*args):
+    # Spawned children start from a fresh interpreter: the app registry has to
+    # be ready before accounts.queue (and its models) can be imported.
+    import django
+    django.setup()
+    from accounts.queue import worker_loop
+    worker_loop(*args)
+
+
+class Command(BaseCommand):
+    help = "Run a pool of worker processes that execute queued background tasks."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=multiprocessing.cpu_count(),
+                            help='Number of worker processes')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds an idle worker waits before polling again')
+        parser.add_argument('--batch-size', type=int, default=10, help='Tasks claimed per poll')
+
+    def handle(self, *args, **options):
+        # Children must open their own database connections
+        connections.close_all()
+        context = multiprocessing.get_context('spawn')
+        stop_event = context.Event()
+        workers = [
+            context.Process(
+                target=start_worker,
+                args=(index, stop_event, options['poll_interval'], options['batch_size']),
+                name=f'task-worker-{index}',
+            )
+            for index in range(options['processes'])
+        ]
+
+        def stop(signum, frame):
+            self.stdout.write('Stopping workers after their current task...')
+            stop_event.set()
+
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGTERM, stop)
+
+        for worker in workers:
+            worker.start()
+        self.stdout.write(self.style.SUCCESS(f'Started {len(workers)} task workers.'))
+        for worker in workers:
+            worker.join()
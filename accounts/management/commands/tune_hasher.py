@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.hashers import MIN_ITERATIONS, recommend_iterations, time_verify
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark password verification on this host and recommend the "
+        "PASSWORD_HASH_ITERATIONS that meets a target latency."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target-ms', type=float, default=250,
+                            help='Time one password verification may take, in milliseconds')
+        parser.add_argument('--samples', type=int, default=5, help='Timed verifications per measurement')
+
+    def handle(self, *args, **options):
+        if options['target_ms'] <= 0 or options['samples'] < 1:
+            raise CommandError('--target-ms and --samples must be positive.')
+        samples = options['samples']
+        current = settings.PASSWORD_HASH_ITERATIONS
+        self.stdout.write(
+            f'Current: {current} iterations, {time_verify(current, samples) * 1000:.1f}ms per verification.'
+        )
+
+        iterations = recommend_iterations(options['target_ms'] / 1000, samples)
+        if iterations < MIN_ITERATIONS:
+            self.stdout.write(self.style.WARNING(
+                f'This host cannot reach {MIN_ITERATIONS} iterations within {options["target_ms"]:g}ms; '
+                'recommending that minimum anyway, as hashes must not be weaker.'
+            ))
+            iterations = MIN_ITERATIONS
+        latency_ms = time_verify(iterations, samples) * 1000
+        self.stdout.write(f'Recommended: {iterations} iterations, {latency_ms:.1f}ms per verification.')
+        self.stdout.write(
+            'Every login and sign-up costs one hash, so each CPU core handles at most '
+            f'{1000 / latency_ms:.0f} of them per second at this setting.'
+        )
+        self.stdout.write(self.style.SUCCESS(f'Set PASSWORD_HASH_ITERATIONS={iterations} in .env'))
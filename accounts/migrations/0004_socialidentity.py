@@ -0,0 +1,77 @@
+# Generated by Django 5.2.6 on 2026-10-19 07:27
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+PROVIDER_COLUMNS = (('google', 'google_id'), ('apple', 'apple_id'))
+
+
+def copy_provider_ids(apps, schema_editor):
+    CustomUser = apps.get_model('accounts', 'CustomUser')
+    SocialIdentity = apps.get_model('accounts', 'SocialIdentity')
+    db = schema_editor.connection.alias
+    for provider, column in PROVIDER_COLUMNS:
+        rows = (
+            CustomUser.objects.using(db)
+            .filter(**{f'{column}__isnull': False})
+            .exclude(**{column: ''})
+            .values_list('id', column)
+            .order_by('id')
+        )
+        batch = []
+        for user_id, subject in rows.iterator(chunk_size=BATCH_SIZE):
+            batch.append(SocialIdentity(user_id=user_id, provider=provider, subject=subject))
+            if len(batch) >= BATCH_SIZE:
+                SocialIdentity.objects.using(db).bulk_create(batch, ignore_conflicts=True)
+                batch = []
+        if batch:
+            SocialIdentity.objects.using(db).bulk_create(batch, ignore_conflicts=True)
+
+
+def restore_provider_ids(apps, schema_editor):
+    CustomUser = apps.get_model('accounts', 'CustomUser')
+    SocialIdentity = apps.get_model('accounts', 'SocialIdentity')
+    db = schema_editor.connection.alias
+    for provider, column in PROVIDER_COLUMNS:
+        identities = (
+            SocialIdentity.objects.using(db)
+            .filter(provider=provider)
+            .values_list('user_id', 'subject')
+            .order_by('id')
+        )
+        batch = []
+        for user_id, subject in identities.iterator(chunk_size=BATCH_SIZE):
+            batch.append(CustomUser(id=user_id, **{column: subject}))
+            if len(batch) >= BATCH_SIZE:
+                CustomUser.objects.using(db).bulk_update(batch, [column])
+                batch = []
+        if batch:
+            CustomUser.objects.using(db).bulk_update(batch, [column])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_customuser_apple_id_alter_customuser_auth_provider'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SocialIdentity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('provider', models.CharField(choices=[('google', 'Google Account'), ('apple', 'Apple Account')], max_length=50)),
+                ('subject', models.CharField(max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='social_identities', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Social identity',
+                'verbose_name_plural': 'Social identities',
+                'constraints': [models.UniqueConstraint(fields=('provider', 'subject'), name='unique_provider_subject')],
+            },
+        ),
+        migrations.RunPython(copy_provider_ids, restore_provider_ids),
+    ]
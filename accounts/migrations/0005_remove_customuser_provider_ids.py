@@ -0,0 +1,21 @@
+# Generated by Django 5.2.6 on 2026-10-19 07:27
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_socialidentity'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='customuser',
+            name='apple_id',
+        ),
+        migrations.RemoveField(
+            model_name='customuser',
+            name='google_id',
+        ),
+    ]
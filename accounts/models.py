@@ -1,6 +1,7 @@
 from django.contrib.auth.base_user import BaseUserManager
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin
 from django.db import models
+from django.utils import timezone
 
 class CustomUserManager(BaseUserManager):
     def create_user(self, email, password=None, **extra_fields):
@@ -30,8 +31,6 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     name = models.CharField(max_length=255, blank=True)
     phone_number = models.CharField(max_length=15, blank=True)
     location = models.CharField(max_length=255, blank=True)
-    google_id = models.CharField(max_length=255, unique=True, null=True, blank=True)
-    apple_id = models.CharField(max_length=255, unique=True, null=True, blank=True)
 
     AUTH_METHOD_CHOICES = [
         ('email', 'Email and Password'),
@@ -45,6 +44,10 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     is_rider = models.BooleanField(default=False)
     profile_picture = models.ImageField(upload_to='profile_pics', null=True, blank=True)
     date_joined = models.DateTimeField(auto_now_add=True)
+    # Bumped whenever a field /api/me/ returns changes (see user_state.update_profile); feeds its ETag
+    profile_version = models.PositiveIntegerField(default=0, editable=False)
+    # JWTs issued before this moment are rejected (see accounts/authentication.py)
+    tokens_valid_after = models.DateTimeField(null=True, blank=True, editable=False)
 
     objects = CustomUserManager()
 
@@ -56,4 +59,64 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
         verbose_name_plural = "Users"
 
     def __str__(self):
-        return self.email
\ No newline at end of file
+        return self.email
+
+
+class SocialIdentity(models.Model):
+    """A provider account (Google, Apple, ...) linked to a user, keyed by the token's `sub`."""
+
+    PROVIDER_CHOICES = [
+        ('google', 'Google Account'),
+        ('apple', 'Apple Account'),
+    ]
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='social_identities')
+    provider = models.CharField(max_length=50, choices=PROVIDER_CHOICES)
+    subject = models.CharField(max_length=255)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Social identity"
+        verbose_name_plural = "Social identities"
+        constraints = [
+            models.UniqueConstraint(fields=['provider', 'subject'], name='unique_provider_subject'),
+        ]
+
+    def __str__(self):
+        return f'{self.provider}:{self.subject}'
+
+
+class Task(models.Model):
+    """A unit of background work, persisted so it survives restarts (see accounts/queue.py)."""
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+    name = models.CharField(max_length=255)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    # Enqueueing the same key twice is a no-op
+    idempotency_key = models.CharField(max_length=255, unique=True, null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+    progress = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='task_status_run_at'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} ({self.status})'
@@ -0,0 +1,201 @@
+import logging
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'CONNECT_TIMEOUT': 3.05,
+    'READ_TIMEOUT': 5,
+    'RETRIES': 2,
+    'BACKOFF': 0.2,
+    'BACKOFF_MAX': 2,
+    'POOL_MAXSIZE': 10,
+    'BREAKER_THRESHOLD': 5,
+    'BREAKER_RESET': 30,
+    'CACHE_TTL': 3600,
+}
+
+
+class ProviderUnavailable(Exception):
+    """Raised when a provider cannot be reached and no cached copy exists."""
+
+
+class CircuitOpen(ProviderUnavailable):
+    """Raised without touching the network while the breaker is open."""
+
+
+class CircuitBreaker:
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, threshold=5, reset_timeout=30, clock=time.monotonic):
+        self.name = name
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+            self._transition(self.HALF_OPEN)
+        return self._state
+
+    def _transition(self, state):
+        if state != self._state:
+            logger.warning(f"Circuit breaker '{self.name}' {self._state} -> {state}")
+            self._state = state
+
+    def allow(self):
+        """Return True if a call may go out; only one probe is let through while half-open."""
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            self._opened_at = None
+            self._transition(self.CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self._state == self.HALF_OPEN or self._failures >= self.threshold:
+                self._opened_at = self._clock()
+                self._transition(self.OPEN)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'name': self.name,
+                'state': self._current_state(),
+                'failures': self._failures,
+                'opened_at': self._opened_at,
+            }
+
+
+class ProviderClient:
+    """Pooled HTTP client for identity-provider calls.
+
+    Every request is bounded by connect/read timeouts, retried with jittered
+    exponential backoff on connection errors and 5xx responses, and guarded by
+    a circuit breaker. JSON documents are cached per URL; when the provider is
+    unhealthy the last good copy is served even if it has gone stale.
+    """
+
+    def __init__(self, name, **options):
+        conf = {**DEFAULTS, **getattr(settings, 'PROVIDER_HTTP', {}), **options}
+        self.name = name
+        self.timeout = (conf['CONNECT_TIMEOUT'], conf['READ_TIMEOUT'])
+        self.retries = conf['RETRIES']
+        self.backoff = conf['BACKOFF']
+        self.backoff_max = conf['BACKOFF_MAX']
+        self.cache_ttl = conf['CACHE_TTL']
+        self.breaker = CircuitBreaker(name, conf['BREAKER_THRESHOLD'], conf['BREAKER_RESET'])
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=conf['POOL_MAXSIZE'])
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._cache = {}
+        self._cache_lock = threading.Lock()
+
+    def _sleep(self, attempt):
+        ceiling = min(self.backoff_max, self.backoff * (2 ** attempt))
+        time.sleep(random.uniform(0, ceiling))
+
+    def _fetch(self, url):
+        # One breaker permit and at most one recorded failure per call, however many attempts it takes
+        if not self.breaker.allow():
+            raise CircuitOpen(f"{self.name} circuit is open")
+        last_error = None
+        for attempt in range(self.retries + 1):
+            try:
+                response = self.session.get(url, timeout=self.timeout)
+                if response.status_code >= 500:
+                    raise requests.HTTPError(f"{response.status_code} from {url}", response=response)
+                response.raise_for_status()
+                payload = response.json()
+            except requests.HTTPError as e:
+                if e.response is not None and e.response.status_code < 500:
+                    self.breaker.record_success()
+                    raise ProviderUnavailable(str(e))
+                last_error = e
+            except (requests.RequestException, ValueError) as e:
+                last_error = e
+            else:
+                self.breaker.record_success()
+                return payload
+            logger.warning(f"{self.name} request failed (attempt {attempt + 1}): {last_error}")
+            if attempt < self.retries:
+                self._sleep(attempt)
+        self.breaker.record_failure()
+        raise ProviderUnavailable(f"{self.name} unavailable: {last_error}")
+
+    def get_json(self, url, refresh=False):
+        with self._cache_lock:
+            cached = self._cache.get(url)
+        if cached and not refresh and time.monotonic() - cached[0] < self.cache_ttl:
+            return cached[1]
+        try:
+            payload = self._fetch(url)
+        except ProviderUnavailable as e:
+            if cached:
+                logger.warning(f"Serving stale {self.name} response for {url}: {e}")
+                return cached[1]
+            raise
+        with self._cache_lock:
+            self._cache[url] = (time.monotonic(), payload)
+        return payload
+
+    def clear_cache(self):
+        with self._cache_lock:
+            self._cache.clear()
+
+    def status(self):
+        return self.breaker.snapshot()
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(name):
+    with _clients_lock:
+        client = _clients.get(name)
+        if client is None:
+            client = _clients[name] = ProviderClient(name)
+        return client
+
+
+def provider_status():
+    """Breaker state for every provider client created in this process."""
+    with _clients_lock:
+        return {name: client.status() for name, client in _clients.items()}
+
+
+def reset_clients():
+    with _clients_lock:
+        _clients.clear()
@@ -0,0 +1,158 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import jwt
+from django.conf import settings
+
+DEFAULTS = {
+    # Longer than any real ID token is; rejected before it is even decoded
+    'MAX_TOKEN_BYTES': 8192,
+    'REJECTED_TOKEN_TTL': 60,
+    'UNKNOWN_KID_TTL': 300,
+    'MAX_ENTRIES': 10000,
+    # At most one forced key-set download per provider per interval, however many unknown kids arrive
+    'KEY_REFRESH_INTERVAL': 60,
+}
+
+
+class TokenRejected(ValueError):
+    """An ID token refused before any key lookup or signature check."""
+
+
+class ExpiringSet:
+    """Bounded, process-local set whose members expire after ``ttl`` seconds."""
+
+    def __init__(self, ttl, max_entries, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def add(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = self._clock() + self.ttl
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __contains__(self, key):
+        with self._lock:
+            expires = self._entries.get(key)
+            if expires is None:
+                return False
+            if expires < self._clock():
+                del self._entries[key]
+                return False
+            return True
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'ID_TOKEN_PRECHECK', {})}
+
+
+_lock = threading.Lock()
+_rejected = None
+_unknown_kids = None
+_last_refresh = {}
+
+
+def _sets():
+    global _rejected, _unknown_kids
+    if _rejected is None:
+        with _lock:
+            if _rejected is None:
+                conf = get_config()
+                _unknown_kids = ExpiringSet(conf['UNKNOWN_KID_TTL'], conf['MAX_ENTRIES'])
+                _rejected = ExpiringSet(conf['REJECTED_TOKEN_TTL'], conf['MAX_ENTRIES'])
+    return _rejected, _unknown_kids
+
+
+def _fingerprint(token):
+    return hashlib.sha256(token.encode('utf-8', 'replace')).digest()
+
+
+def precheck(token, issuers, audiences, algorithms):
+    """Reject ``token`` on structure, ``alg``, ``exp``, ``iss`` and ``aud`` without touching keys.
+
+    ``audiences`` is a set; the ``aud`` claim is checked by membership.
+
+    Returns the unverified header. Tokens rejected recently (here or by the
+    signature check, see ``remember_rejection``) are refused from a hash lookup.
+    """
+    rejected, _ = _sets()
+    if not isinstance(token, str) or not token:
+        raise TokenRejected('Token must be a non-empty string')
+    if len(token) > get_config()['MAX_TOKEN_BYTES']:
+        raise TokenRejected('Token is too long')
+    if _fingerprint(token) in rejected:
+        raise TokenRejected('Token was recently rejected')
+    if token.count('.') != 2 or token.endswith('.'):
+        raise TokenRejected('Token is not a signed JWT')
+    try:
+        header = jwt.get_unverified_header(token)
+        if header.get('alg') not in algorithms:
+            raise TokenRejected(f"Algorithm {header.get('alg')!r} is not allowed")
+        if not isinstance(header.get('kid'), str):
+            raise TokenRejected('Token header has no key ID')
+        claims = jwt.decode(
+            token,
+            issuer=issuers,
+            options={
+                'verify_signature': False,
+                'verify_exp': True,
+                'verify_iat': False,
+                'verify_aud': False,
+                'verify_iss': True,
+                'require': ['exp', 'iss', 'aud', 'sub'],
+            },
+        )
+    except jwt.InvalidTokenError as e:
+        raise TokenRejected(str(e)) from e
+    aud = claims['aud']
+    claimed = [aud] if isinstance(aud, str) else [a for a in aud if isinstance(a, str)]
+    if not any(a in audiences for a in claimed):
+        raise TokenRejected(f"Audience {aud!r} is not configured")
+    return header
+
+
+def remember_rejection(token):
+    """Refuse ``token`` from the precheck for ``REJECTED_TOKEN_TTL`` seconds."""
+    if isinstance(token, str) and len(token) <= get_config()['MAX_TOKEN_BYTES']:
+        _sets()[0].add(_fingerprint(token))
+
+
+def is_unknown_kid(provider, kid):
+    return (provider, kid) in _sets()[1]
+
+
+def remember_unknown_kid(provider, kid):
+    _sets()[1].add((provider, kid))
+
+
+def may_refresh_keys(provider):
+    """True at most once per ``KEY_REFRESH_INTERVAL`` per provider; gates forced key downloads."""
+    now = time.monotonic()
+    with _lock:
+        last = _last_refresh.get(provider)
+        if last is not None and now - last < get_config()['KEY_REFRESH_INTERVAL']:
+            return False
+        _last_refresh[provider] = now
+        return True
+
+
+def reset():
+    """Forget every negative-cache entry and pick up current settings."""
+    global _rejected, _unknown_kids
+    with _lock:
+        _rejected = _unknown_kids = None
+        _last_refresh.clear()
@@ -0,0 +1,212 @@
+import contextvars
+import datetime
+import logging
+import os
+import random
+import signal
+import socket
+import time
+import traceback
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connection
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'MAX_ATTEMPTS': 5,
+    'BACKOFF': 5,
+    'BACKOFF_MAX': 15 * 60,
+    # A running task whose worker has been silent this long is handed to another worker
+    'VISIBILITY_TIMEOUT': 10 * 60,
+    # Finished (succeeded or failed) tasks are deleted this long after they finish; None keeps them
+    'RETENTION': 7 * 24 * 3600,
+    'PRUNE_INTERVAL': 60 * 60,
+}
+
+_registry = {}
+_current_task = contextvars.ContextVar('current_task', default=None)
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'TASK_QUEUE', {})}
+
+
+def task(name=None, max_attempts=None):
+    """Register a function as a task; call ``fn.enqueue(**payload)`` to schedule it."""
+
+    def decorator(fn):
+        task_name = name or f'{fn.__module__}.{fn.__name__}'
+        _registry[task_name] = fn
+        fn.task_name = task_name
+        fn.max_attempts = max_attempts
+        fn.enqueue = lambda idempotency_key=None, run_at=None, **payload: enqueue(
+            task_name, payload, idempotency_key=idempotency_key, run_at=run_at, max_attempts=max_attempts,
+        )
+        fn.build = lambda idempotency_key=None, run_at=None, **payload: build(
+            task_name, payload, idempotency_key=idempotency_key, run_at=run_at, max_attempts=max_attempts,
+        )
+        return fn
+
+    return decorator
+
+
+def build(name, payload, idempotency_key=None, run_at=None, max_attempts=None):
+    return Task(
+        name=name,
+        payload=payload,
+        idempotency_key=idempotency_key,
+        run_at=run_at or timezone.now(),
+        max_attempts=max_attempts or get_config()['MAX_ATTEMPTS'],
+    )
+
+
+def enqueue_many(tasks):
+    """Persist tasks in one INSERT; tasks whose idempotency key already exists are skipped."""
+    if not tasks:
+        return
+    if len(tasks) == 1 and not connection.in_atomic_block:
+        # bulk_create would wrap the lone INSERT in its own BEGIN/COMMIT
+        try:
+            tasks[0].save(force_insert=True)
+        except IntegrityError:
+            pass  # already queued under this idempotency key
+        return
+    Task.objects.bulk_create(tasks, ignore_conflicts=True)
+
+
+def enqueue(name, payload, idempotency_key=None, run_at=None, max_attempts=None):
+    task_obj = build(name, payload, idempotency_key, run_at, max_attempts)
+    if idempotency_key:
+        enqueue_many([task_obj])
+    else:
+        task_obj.save()
+    return task_obj
+
+
+def set_progress(**progress):
+    """Record progress for the task currently running in this worker."""
+    task_id = _current_task.get()
+    if task_id is not None:
+        Task.objects.filter(pk=task_id).update(progress=progress, locked_at=timezone.now())
+
+
+def _backoff(attempts):
+    conf = get_config()
+    ceiling = min(conf['BACKOFF_MAX'], conf['BACKOFF'] * (2 ** (attempts - 1)))
+    return datetime.timedelta(seconds=random.uniform(ceiling / 2, ceiling))
+
+
+def claim(worker_id, limit=10):
+    """Claim up to ``limit`` due tasks with a compare-and-set UPDATE per task.
+
+    Works on every backend (no SELECT ... FOR UPDATE SKIP LOCKED needed): a task
+    is ours only if our UPDATE changed it from the state we read. A task whose
+    worker died is retried only while it has attempts left; otherwise it fails.
+    """
+    now = timezone.now()
+    stale = now - datetime.timedelta(seconds=get_config()['VISIBILITY_TIMEOUT'])
+    lost = Q(status=Task.RUNNING, locked_at__lt=stale)
+    Task.objects.filter(lost, attempts__gte=F('max_attempts')).update(
+        status=Task.FAILED, last_error='Worker lost', finished_at=now,
+    )
+    due = Q(status=Task.PENDING, run_at__lte=now) | (lost & Q(attempts__lt=F('max_attempts')))
+    candidates = Task.objects.filter(due).order_by('run_at').values_list('pk', 'status', 'attempts')[:limit]
+    claimed = []
+    for pk, task_status, attempts in candidates:
+        won = Task.objects.filter(pk=pk, status=task_status, attempts=attempts).update(
+            status=Task.RUNNING, locked_by=worker_id, locked_at=now, attempts=F('attempts') + 1,
+        )
+        if won:
+            claimed.append(pk)
+    return list(Task.objects.filter(pk__in=claimed).order_by('run_at'))
+
+
+def execute(task_obj):
+    fn = _registry.get(task_obj.name)
+    token = _current_task.set(task_obj.pk)
+    try:
+        if fn is None:
+            raise LookupError(f"No task registered as '{task_obj.name}'")
+        fn(**task_obj.payload)
+    except Exception:
+        error = traceback.format_exc()
+        if task_obj.attempts >= task_obj.max_attempts:
+            logger.error(f"Task {task_obj.pk} {task_obj.name} failed permanently: {error}")
+            Task.objects.filter(pk=task_obj.pk).update(
+                status=Task.FAILED, last_error=error, finished_at=timezone.now(),
+            )
+        else:
+            retry_at = timezone.now() + _backoff(task_obj.attempts)
+            logger.warning(f"Task {task_obj.pk} {task_obj.name} failed, retrying at {retry_at}")
+            Task.objects.filter(pk=task_obj.pk).update(
+                status=Task.PENDING, last_error=error, run_at=retry_at, locked_by='', locked_at=None,
+            )
+        return False
+    finally:
+        _current_task.reset(token)
+    Task.objects.filter(pk=task_obj.pk).update(status=Task.SUCCEEDED, finished_at=timezone.now())
+    return True
+
+
+def prune(now=None):
+    """Delete tasks that finished more than ``RETENTION`` seconds ago; returns how many."""
+    retention = get_config()['RETENTION']
+    if retention is None:
+        return 0
+    cutoff = (now or timezone.now()) - datetime.timedelta(seconds=retention)
+    deleted, _ = Task.objects.filter(
+        status__in=[Task.SUCCEEDED, Task.FAILED], finished_at__lt=cutoff,
+    ).delete()
+    return deleted
+
+
+def run_pending(worker_id='inline', limit=100):
+    """Run every due task in this process; returns how many were processed."""
+    processed = 0
+    while True:
+        batch = claim(worker_id, limit)
+        if not batch:
+            return processed
+        for task_obj in batch:
+            execute(task_obj)
+            processed += 1
+
+
+def worker_loop(index, stop_event, poll_interval=1.0, batch_size=10):
+    """Body of one ``run_workers`` process."""
+    # Ctrl-C reaches the whole process group; let the parent stop us via stop_event
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    autodiscover()
+    worker_id = f'{socket.gethostname()}:{os.getpid()}:{index}'
+    logger.info(f"Task worker {worker_id} started")
+    pruned_at = None
+    while not stop_event.is_set():
+        close_old_connections()
+        if pruned_at is None or time.monotonic() - pruned_at >= get_config()['PRUNE_INTERVAL']:
+            pruned_at = time.monotonic()
+            deleted = prune()
+            if deleted:
+                logger.info(f"Task worker {worker_id} pruned {deleted} finished tasks")
+        batch = claim(worker_id, batch_size)
+        for task_obj in batch:
+            if stop_event.is_set():
+                # Hand unstarted tasks back instead of waiting for the visibility timeout
+                Task.objects.filter(pk=task_obj.pk, locked_by=worker_id).update(
+                    status=Task.PENDING, attempts=F('attempts') - 1, locked_by='', locked_at=None,
+                )
+                continue
+            execute(task_obj)
+        if not batch:
+            stop_event.wait(poll_interval)
+    logger.info(f"Task worker {worker_id} stopped")
+
+
+def autodiscover():
+    """Import ``tasks`` modules of installed apps so their tasks are registered."""
+    from django.utils.module_loading import autodiscover_modules
+    autodiscover_modules('tasks')
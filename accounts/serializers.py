@@ -3,59 +3,93 @@ import logging
 import requests
 from rest_framework import serializers
 from rest_framework_simplejwt.tokens import RefreshToken
-from rest_framework.exceptions import ValidationError
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework.exceptions import Throttled, ValidationError
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
 from django.contrib.auth import get_user_model, authenticate
+from django.contrib.auth.models import update_last_login
 from django.contrib.auth.password_validation import validate_password
-from django.db import IntegrityError
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import IntegrityError, connection, transaction
+from backend.tracing import span
 from .google import Google
+from .models import SocialIdentity
+from .authentication import issued_before_revocation
+from . import user_state
+from .tasks import enqueue_login_side_effects
 from .apple import Apple
+from .audiences import BudgetExceeded
 
 User = get_user_model()
 
 logger = logging.getLogger(__name__)
 
+def mint_tokens(user):
+    with span('token.mint'):
+        refresh = RefreshToken.for_user(user)
+        return {
+            'access': str(refresh.access_token),
+            'refresh': str(refresh),
+        }
+
+def verify_id_token(provider, token):
+    """Verify a Google/Apple ID token; an exhausted per-audience budget becomes HTTP 429."""
+    try:
+        return provider.validate(token)
+    except BudgetExceeded as e:
+        raise Throttled(wait=e.retry_after, detail=f'Too many {e.audience.provider} logins for this app.')
+
 def register_social_user(provider, user_id, email, name=''):
+    # Returning users resolve with one indexed probe on (provider, subject)
+    identity = (
+        SocialIdentity.objects.select_related('user')
+        .filter(provider=provider, subject=user_id)
+        .first()
+    )
+    if identity:
+        return identity.user, False
+
+    label = provider.capitalize()
     user = User.objects.filter(email=email).first()
     if user:
         if user.auth_provider != provider:
             raise ValidationError(
                 f'This email is registered with {user.auth_provider.capitalize()}. Please log in using {user.auth_provider.capitalize()}.'
             )
-        if provider == 'google' and user.google_id and user.google_id != user_id:
-            raise ValidationError('This email is linked to a different Google account.')
-        if provider == 'apple' and user.apple_id and user.apple_id != user_id:
-            raise ValidationError('This email is linked to a different Apple account.')
-        if provider == 'google' and not user.google_id:
-            user.google_id = user_id
-            user.name = name
-            user.save()
-        if provider == 'apple' and not user.apple_id:
-            user.apple_id = user_id
-            user.name = name
-            user.save()
-        return user
+        if user.social_identities.filter(provider=provider).exists():
+            raise ValidationError(f'This email is linked to a different {label} account.')
+        try:
+            with transaction.atomic():
+                SocialIdentity.objects.create(user=user, provider=provider, subject=user_id)
+        except IntegrityError:
+            raise ValidationError(f'This {label} account is already linked to another user.')
+        if name and name != user.name:
+            user_state.update_profile(user, name=name)
+        return user, False
 
-    extra_fields = {
-        'name': name,
-        'auth_provider': provider,
-        'is_active': True,
-    }
-    if provider == 'google':
-        extra_fields['google_id'] = user_id
-    elif provider == 'apple':
-        extra_fields['apple_id'] = user_id
-    user = User.objects.create_user(
-        email=email,
-        **extra_fields
-    )
-    return user
+    try:
+        with transaction.atomic():
+            user = User.objects.create_user(
+                email=email,
+                name=name,
+                auth_provider=provider,
+                is_active=True,
+            )
+            SocialIdentity.objects.create(user=user, provider=provider, subject=user_id)
+    except IntegrityError:
+        # A concurrent first login for the same subject or email won the race
+        identity = SocialIdentity.objects.select_related('user').filter(provider=provider, subject=user_id).first()
+        if identity:
+            return identity.user, False
+        raise ValidationError(f'This email is already registered. Please log in using {label}.')
+    return user, True
 
 class GoogleSocialAuthSerializer(serializers.Serializer):
     auth_token = serializers.CharField()
 
     def validate_auth_token(self, auth_token):
-        user_data = Google.validate(auth_token)
+        user_data = verify_id_token(Google, auth_token)
         if not user_data or not user_data.get('email_verified'):
             raise serializers.ValidationError(
                 'The token is invalid, expired, or email not verified.'
@@ -63,19 +97,20 @@ class GoogleSocialAuthSerializer(serializers.Serializer):
         user_id = user_data['sub']
         email = user_data['email']
         name = user_data['name']
-        user = register_social_user(
-            provider='google', user_id=user_id, email=email, name=name
-        )
-        refresh = RefreshToken.for_user(user)
+        with span('db.register_social_user', provider='google'):
+            user, created = register_social_user(
+                provider='google', user_id=user_id, email=email, name=name
+            )
+        with span('tasks.enqueue'):
+            enqueue_login_side_effects(user, 'google', created, picture=user_data.get('picture'))
         return {
             'userId': user.id,
             'user': {
                 'email': user.email,
                 'name': user.name,
-                'google_id': user.google_id,
+                'google_id': user_id,
             },
-            'access': str(refresh.access_token),
-            'refresh': str(refresh),
+            **mint_tokens(user),
         }
 
 class AppleSocialAuthSerializer(serializers.Serializer):
@@ -84,7 +119,7 @@ class AppleSocialAuthSerializer(serializers.Serializer):
 
     def validate(self, attrs):
         id_token = attrs['auth_token']
-        user_data = Apple.validate(id_token)
+        user_data = verify_id_token(Apple, id_token)
         if not user_data or not user_data.get('email_verified'):
             raise serializers.ValidationError(
                 'The token is invalid, expired, or email not verified.'
@@ -97,19 +132,20 @@ class AppleSocialAuthSerializer(serializers.Serializer):
             first_name = full_name.get('firstName', '')
             last_name = full_name.get('lastName', '')
             name = f"{first_name} {last_name}".strip()
-        user = register_social_user(
-            provider='apple', user_id=user_id, email=email, name=name
-        )
-        refresh = RefreshToken.for_user(user)
+        with span('db.register_social_user', provider='apple'):
+            user, created = register_social_user(
+                provider='apple', user_id=user_id, email=email, name=name
+            )
+        with span('tasks.enqueue'):
+            enqueue_login_side_effects(user, 'apple', created)
         return {
             'userId': user.id,
             'user': {
                 'email': user.email,
                 'name': user.name,
-                'apple_id': user.apple_id,
+                'apple_id': user_id,
             },
-            'access': str(refresh.access_token),
-            'refresh': str(refresh),
+            **mint_tokens(user),
         }
 
 class TokenResponseSerializer(serializers.Serializer):
@@ -137,12 +173,19 @@ class EmailTokenObtainPairSerializer(TokenObtainPairSerializer):
                 'This account is registered with Google OAuth. Please log in using Google.'
             )
 
-        user = authenticate(request=self.context.get("request"), email=email, password=password)
-        if not user or not user.is_active:
+        # The one password verification of this login. ModelBackend re-encodes
+        # hashes whose work factor differs from PASSWORD_HASH_ITERATIONS here.
+        with span('auth.authenticate'):
+            user = authenticate(request=self.context.get("request"), email=email, password=password)
+        if not user or not api_settings.USER_AUTHENTICATION_RULE(user):
             raise serializers.ValidationError({"detail": "Invalid credentials or inactive account."})
 
-        data = super().validate(attrs)
+        # super().validate() would authenticate (and hash) a second time
         self.user = user
+        with span('token.obtain'):
+            data = mint_tokens(user)
+        if api_settings.UPDATE_LAST_LOGIN:
+            update_last_login(None, user)
         data.update({
             'userId': user.id,
             'user': {
@@ -153,34 +196,100 @@ class EmailTokenObtainPairSerializer(TokenObtainPairSerializer):
         return data
 
 
+class RevocableTokenRefreshSerializer(TokenRefreshSerializer):
+    """Refuse to refresh tokens of deleted or deactivated users, or tokens issued before revocation.
+
+    The user is checked against the cached, version-stamped state instead of
+    being fetched like super().validate() does, and the token is decoded once.
+    Without the blacklist app a refresh touches the database only on a cache miss.
+    """
+
+    def validate(self, attrs):
+        with span('token.verify'):
+            refresh = self.token_class(attrs['refresh'])
+        with span('user_state.check'):
+            state = user_state.get_or_load_state(refresh.payload.get(api_settings.USER_ID_CLAIM))
+        if (
+            state is None
+            or not state['is_active']
+            or issued_before_revocation(refresh.payload, state['tokens_valid_after'])
+        ):
+            raise AuthenticationFailed(self.error_messages['no_active_account'], 'no_active_account')
+
+        with span('token.mint'):
+            data = {'access': str(refresh.access_token)}
+            if api_settings.ROTATE_REFRESH_TOKENS:
+                if api_settings.BLACKLIST_AFTER_ROTATION:
+                    try:
+                        refresh.blacklist()
+                    except AttributeError:
+                        # The blacklist app is not installed
+                        pass
+                refresh.set_jti()
+                refresh.set_exp()
+                refresh.set_iat()
+                refresh.outstand()
+                data['refresh'] = str(refresh)
+        return data
+
+
 class RegisterSerializer(serializers.ModelSerializer):
-    password = serializers.CharField(write_only=True, required=True, validators=[validate_password], help_text="User's password")
+    password = serializers.CharField(write_only=True, required=True, help_text="User's password")
     password2 = serializers.CharField(write_only=True, required=True, help_text="Confirm password")
 
     class Meta:
         model = User
         fields = ['name', 'email', 'phone_number', 'location', 'password', 'password2']
+        # Uniqueness is enforced by the INSERT in create(), not by a SELECT beforehand
+        extra_kwargs = {'email': {'validators': []}}
 
     def validate(self, attrs):
         if attrs['password'] != attrs['password2']:
             raise serializers.ValidationError({"password2": "Password fields didn't match."})
-        if User.objects.filter(email=attrs['email'], auth_provider='google').exists():
-            raise ValidationError(
-                'This email is registered with Google OAuth. Please log in using Google.'
-            )
+        user = User(
+            email=User.objects.normalize_email(attrs['email']),
+            name=attrs.get('name', ''),
+            phone_number=attrs.get('phone_number', ''),
+            location=attrs.get('location', ''),
+            auth_provider='email',
+            is_active=True,
+        )
+        # Run the validators once, against the populated user, so attribute
+        # similarity checks see the submitted name and email.
+        try:
+            with span('password.validate'):
+                validate_password(attrs['password'], user)
+        except DjangoValidationError as e:
+            raise serializers.ValidationError({"password": list(e.messages)})
+        self._user = user
         return attrs
 
     def create(self, validated_data):
-        validated_data.pop('password2')
+        user = self._user
+        with span('password.hash'):
+            user.set_password(validated_data['password'])
         try:
-            user = User.objects.create_user(
-                email=validated_data['email'],
-                password=validated_data['password'],
-                name=validated_data.get('name', ''),
-                phone_number=validated_data.get('phone_number', ''),
-                location=validated_data.get('location', ''),
-                auth_provider='email',
-            )
-            return user
+            with span('db.insert_user'):
+                if connection.in_atomic_block:
+                    # Keep an enclosing transaction usable if the INSERT conflicts
+                    with transaction.atomic():
+                        user.save(force_insert=True)
+                else:
+                    user.save(force_insert=True)
         except IntegrityError:
-            raise ValidationError({"detail": "This email is registered with Google OAuth. Please log in using Google."})
\ No newline at end of file
+            provider = User.objects.filter(email=user.email).values_list('auth_provider', flat=True).first()
+            if provider is None:
+                raise ValidationError({"detail": "Unable to create an account with this email."})
+            if provider == 'email':
+                raise ValidationError({"detail": "An account with this email already exists. Please log in."})
+            raise ValidationError({
+                "detail": f"This email is registered with {provider.capitalize()}. Please log in using {provider.capitalize()}."
+            })
+        return user
+
+
+class MeSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = User
+        fields = ['id', 'email', 'name', 'phone_number', 'location', 'auth_provider']
+        read_only_fields = ['id', 'email', 'auth_provider']
@@ -0,0 +1,19 @@
+from django.core.signals import setting_changed
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import CustomUser
+from . import audiences, user_state
+
+
+# accounts/bulk.py also invalidates each chunk once it is committed
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def invalidate_user_state(sender, instance, **kwargs):
+    user_state.invalidate(instance.pk)
+
+
+@receiver(setting_changed)
+def recompile_audiences(setting, **kwargs):
+    if setting in ('SOCIAL_AUDIENCES', 'GOOGLE_CLIENT_ID', 'APPLE_BUNDLE_ID'):
+        audiences.reset()
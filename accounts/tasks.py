@@ -0,0 +1,81 @@
+import hashlib
+import json
+import logging
+import os
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.mail import send_mail
+from django.utils import timezone
+
+from . import bulk
+from .queue import enqueue_many, set_progress, task
+
+logger = logging.getLogger(__name__)
+analytics_logger = logging.getLogger('accounts.analytics')
+
+MAX_PICTURE_BYTES = 5 * 1024 * 1024
+
+
+@task(max_attempts=5)
+def sync_profile_picture(user_id, url):
+    """Download a provider profile picture into ``profile_picture``."""
+    user = get_user_model().objects.filter(pk=user_id).first()
+    if user is None:
+        return
+    response = requests.get(url, timeout=(3.05, 10), stream=True)
+    response.raise_for_status()
+    content = response.raw.read(MAX_PICTURE_BYTES + 1, decode_content=True)
+    if len(content) > MAX_PICTURE_BYTES:
+        logger.warning(f"Profile picture for user {user_id} exceeds {MAX_PICTURE_BYTES} bytes; skipped")
+        return
+    extension = os.path.splitext(urlsplit(url).path)[1] or '.jpg'
+    digest = hashlib.sha1(url.encode()).hexdigest()[:12]
+    user.profile_picture.save(f'{user_id}-{digest}{extension}', ContentFile(content), save=False)
+    user.save(update_fields=['profile_picture'])
+
+
+@task(max_attempts=8)
+def send_welcome_email(user_id):
+    user = get_user_model().objects.filter(pk=user_id).first()
+    if user is None or not user.email:
+        return
+    send_mail(
+        'Welcome!',
+        f"Hi {user.name or 'there'},\n\nThanks for signing up.",
+        None,
+        [user.email],
+    )
+
+
+def record_login(user_id, provider, created, at):
+    analytics_logger.info(json.dumps(
+        {'event': 'login', 'user_id': user_id, 'provider': provider, 'new_user': created, 'at': at}
+    ))
+
+
+@task(max_attempts=1)
+def run_bulk_action(action, user_ids, chunk_size=None):
+    bulk.ACTIONS[action](
+        user_ids, chunk_size, lambda done, total: set_progress(done=done, total=total),
+    )
+
+
+def enqueue_login_side_effects(user, provider, created=False, picture=None):
+    """Log the login and queue any post-login work with a single INSERT.
+
+    Analytics go straight to the logger, so a returning user queues nothing.
+    """
+    record_login(user.pk, provider, created, timezone.now().isoformat())
+    tasks = []
+    if created:
+        tasks.append(send_welcome_email.build(idempotency_key=f'welcome:{user.pk}', user_id=user.pk))
+    if picture and getattr(settings, 'SYNC_PROFILE_PICTURES', True):
+        digest = hashlib.sha1(picture.encode()).hexdigest()
+        tasks.append(sync_profile_picture.build(
+            idempotency_key=f'picture:{user.pk}:{digest}', user_id=user.pk, url=picture,
+        ))
+    enqueue_many(tasks)
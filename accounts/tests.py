@@ -1,3 +1,760 @@
-from django.test import TestCase
+import datetime
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import jwt as pyjwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+from rest_framework import status
+from rest_framework.test import APIClient, APITestCase
+
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache, caches
+from django.core.cache.backends.db import DatabaseCache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from backend.tracing import get_processor, reset_processor
+
+from . import audiences, bulk, keyring, precheck, queue, user_state
+from .apple import Apple
+from .google import Google
+from .hashers import MIN_ITERATIONS, TunablePBKDF2PasswordHasher
+from .loadtest import FakeIssuer, saturation_point
+from .models import CustomUser, SocialIdentity, Task
+from .outbound import CircuitBreaker, CircuitOpen, ProviderClient, ProviderUnavailable, reset_clients
+from .serializers import mint_tokens
+
+# Query budgets assume the cache lives outside the database, as Redis does in production
+MEMORY_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+class StubProvider:
+    """Local HTTP server whose responses are scripted per test."""
+
+    def __init__(self):
+        self.responses = []
+        self.hits = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.hits += 1
+                status, body = stub.responses.pop(0) if stub.responses else (200, {'keys': []})
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}/keys'
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class ProviderClientTests(SimpleTestCase):
+    def setUp(self):
+        self.stub = StubProvider()
+        self.addCleanup(self.stub.close)
+        self.client_ = ProviderClient(
+            'stub', RETRIES=1, BACKOFF=0, BREAKER_THRESHOLD=2, BREAKER_RESET=60, CACHE_TTL=0,
+        )
+
+    def test_retries_server_errors(self):
+        self.stub.responses = [(503, {}), (200, {'keys': [{'kid': 'a'}]})]
+        self.assertEqual(self.client_.get_json(self.stub.url), {'keys': [{'kid': 'a'}]})
+        self.assertEqual(self.stub.hits, 2)
+        self.assertEqual(self.client_.status()['state'], CircuitBreaker.CLOSED)
+
+    def test_failed_call_counts_once_toward_threshold(self):
+        self.stub.responses = [(500, {}), (500, {})]
+        with self.assertRaises(ProviderUnavailable):
+            self.client_.get_json(self.stub.url)
+        self.assertEqual(self.stub.hits, 2)
+        self.assertEqual(self.client_.status()['failures'], 1)
+        self.assertEqual(self.client_.status()['state'], CircuitBreaker.CLOSED)
+
+    def test_breaker_opens_and_fails_fast(self):
+        self.stub.responses = [(500, {})] * 4
+        for _ in range(2):
+            with self.assertRaises(ProviderUnavailable):
+                self.client_.get_json(self.stub.url)
+        self.assertEqual(self.client_.status()['state'], CircuitBreaker.OPEN)
+        with self.assertRaises(CircuitOpen):
+            self.client_.get_json(self.stub.url)
+        self.assertEqual(self.stub.hits, 4)
+
+    def test_serves_stale_copy_while_unhealthy(self):
+        self.stub.responses = [(200, {'keys': [{'kid': 'a'}]}), (500, {}), (500, {})]
+        self.client_.get_json(self.stub.url)
+        self.assertEqual(self.client_.get_json(self.stub.url), {'keys': [{'kid': 'a'}]})
+        self.assertEqual(self.client_.status()['failures'], 1)
+
+    def test_half_open_probe_closes_breaker(self):
+        now = [0]
+        breaker = CircuitBreaker('probe', threshold=1, reset_timeout=10, clock=lambda: now[0])
+        breaker.record_failure()
+        self.assertFalse(breaker.allow())
+        now[0] = 10
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+
+@override_settings(CACHES=MEMORY_CACHE)
+class RegisterTests(APITestCase):
+    payload = {
+        'email': 'new@example.com',
+        'password': 'Zq8!vorpal-kettle',
+        'password2': 'Zq8!vorpal-kettle',
+        'name': 'New User',
+    }
+
+    def test_signup_inserts_user_and_welcome_task(self):
+        # One SAVEPOINT/INSERT/RELEASE triple for the user inside the test
+        # transaction plus the INSERT queueing the welcome email
+        with self.assertNumQueries(4):
+            response = self.client.post('/api/auth/signup/', self.payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        user = CustomUser.objects.get(email='new@example.com')
+        self.assertEqual(response.data['data']['userId'], user.id)
+        self.assertTrue(user.check_password(self.payload['password']))
+        self.assertEqual(user.auth_provider, 'email')
+
+    def test_conflict_reports_existing_provider(self):
+        user = CustomUser.objects.create_user(email='new@example.com', auth_provider='apple')
+        SocialIdentity.objects.create(user=user, provider='apple', subject='001234')
+        response = self.client.post('/api/auth/signup/', self.payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('Apple', response.data['error']['detail'])
+
+    def test_password_similar_to_email_is_rejected(self):
+        payload = {**self.payload, 'password': 'new@example.com', 'password2': 'new@example.com'}
+        response = self.client.post('/api/auth/signup/', payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('password', response.data['error'])
+        self.assertFalse(CustomUser.objects.exists())
+
+
+@override_settings(CACHES=MEMORY_CACHE)
+class RegisterAutocommitTests(TransactionTestCase):
+    def test_signup_query_budget(self):
+        # The user INSERT plus the INSERT queueing the welcome email
+        with self.assertNumQueries(2):
+            response = APIClient().post('/api/auth/signup/', RegisterTests.payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_duplicate_key_outside_transaction_is_skipped(self):
+        queue.enqueue('tests.flaky', {'fail': False}, idempotency_key='once')
+        with self.assertNumQueries(1):
+            queue.enqueue('tests.flaky', {'fail': False}, idempotency_key='once')
+        self.assertEqual(Task.objects.count(), 1)
+
+
+class IssuerTestCase(APITestCase):
+    """Points Google/Apple key fetches at a local FakeIssuer."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        key_dir = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(key_dir.cleanup)
+        cls.issuer = FakeIssuer(os.path.join(key_dir.name, 'issuer.pem'), port=0)
+        cls.issuer.start()
+        cls.settings_override = override_settings(
+            GOOGLE_CERTS_URL=cls.issuer.google_certs_url,
+            APPLE_JWKS_URL=cls.issuer.apple_jwks_url,
+        )
+        cls.settings_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings_override.disable()
+        cls.issuer.stop()
+        super().tearDownClass()
+
+    def setUp(self):
+        reset_clients()
+        precheck.reset()
+        self.addCleanup(reset_clients)
+        self.addCleanup(precheck.reset)
+
+
+class SocialLoginTests(IssuerTestCase):
+    def test_google_login_creates_user(self):
+        token = self.issuer.mint('google', settings.GOOGLE_CLIENT_ID, 'g-1', 'g1@example.com', name='G One')
+        response = self.client.post('/api/auth/google/', {'auth_token': token}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['data']['auth_token']['user']['google_id'], 'g-1')
+
+    def test_apple_login_creates_user(self):
+        token = self.issuer.mint('apple', 'com.example.app', 'a-1', 'a1@example.com')
+        with self.settings(APPLE_BUNDLE_ID='com.example.app'):
+            response = self.client.post('/api/auth/apple/', {'auth_token': token}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['data']['user']['apple_id'], 'a-1')
+
+    def test_returning_user_resolves_by_subject(self):
+        first = self.issuer.mint('google', settings.GOOGLE_CLIENT_ID, 'g-1', 'g1@example.com')
+        self.client.post('/api/auth/google/', {'auth_token': first}, format='json')
+        # The provider-side email changed; the subject still identifies the user
+        again = self.issuer.mint('google', settings.GOOGLE_CLIENT_ID, 'g-1', 'renamed@example.com')
+        # Only the identity lookup; login analytics are logged, not queued
+        with self.assertNumQueries(1), self.assertLogs('accounts.analytics', 'INFO') as logs:
+            response = self.client.post('/api/auth/google/', {'auth_token': again}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(logs.records[0].getMessage())['provider'], 'google')
+        self.assertEqual(response.data['data']['auth_token']['user']['email'], 'g1@example.com')
+
+    def test_second_subject_for_same_email_is_rejected(self):
+        first = self.issuer.mint('google', settings.GOOGLE_CLIENT_ID, 'g-1', 'g1@example.com')
+        self.client.post('/api/auth/google/', {'auth_token': first}, format='json')
+        other = self.issuer.mint('google', settings.GOOGLE_CLIENT_ID, 'g-2', 'g1@example.com')
+        response = self.client.post('/api/auth/google/', {'auth_token': other}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(SocialIdentity.objects.count(), 1)
+
+    def test_wrong_audience_is_rejected(self):
+        token = self.issuer.mint('google', 'someone-else', 'g-2', 'g2@example.com')
+        response = self.client.post('/api/auth/google/', {'auth_token': token}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class TokenPrecheckTests(IssuerTestCase):
+    def sign(self, key=None, kid=None, **claims):
+        now = int(time.time())
+        claims = {
+            'iss': 'https://accounts.google.com', 'aud': settings.GOOGLE_CLIENT_ID, 'sub': 'g-1',
+            'iat': now, 'exp': now + 600, **claims,
+        }
+        return pyjwt.encode(claims, key or self.issuer.private_key, algorithm='RS256',
+                            headers={'kid': kid or self.issuer.kid})
+
+    def count_fetches(self):
+        return mock.patch.object(ProviderClient, 'get_json', autospec=True, side_effect=ProviderClient.get_json)
+
+    def test_malformed_tokens_are_rejected_before_key_lookup(self):
+        now = int(time.time())
+        tokens = [
+            '', 'garbage', 'a.b.c', 'x' * 10000,
+            self.sign(exp=now - 10),
+            self.sign(aud='someone-else'),
+            self.sign(iss='https://evil.example'),
+            pyjwt.encode({'iss': 'accounts.google.com', 'aud': settings.GOOGLE_CLIENT_ID, 'sub': 'g', 'exp': now + 60},
+                         'secret', algorithm='HS256', headers={'kid': self.issuer.kid}),
+        ]
+        with self.count_fetches() as fetch:
+            for token in tokens:
+                self.assertIsNone(Google.validate(token))
+                self.assertIsNone(Apple.validate(token))
+        fetch.assert_not_called()
+
+    def test_unknown_kid_is_negatively_cached(self):
+        with self.count_fetches() as fetch:
+            self.assertIsNone(Google.validate(self.sign(kid='retired')))
+            self.assertEqual(fetch.call_count, 2)  # cached copy, then one forced refresh
+            self.assertIsNone(Google.validate(self.sign(kid='retired', sub='g-2')))
+            self.assertEqual(fetch.call_count, 2)
+
+    def test_forced_key_refresh_is_rate_limited(self):
+        with self.count_fetches() as fetch:
+            for kid in ('k1', 'k2', 'k3'):
+                self.assertIsNone(Google.validate(self.sign(kid=kid)))
+        refreshes = [c for c in fetch.call_args_list if c.kwargs.get('refresh')]
+        self.assertEqual(len(refreshes), 1)
+
+    def test_bad_signature_is_remembered(self):
+        forged = self.sign(key=rsa.generate_private_key(public_exponent=65537, key_size=2048))
+        self.assertIsNone(Google.validate(forged))
+        with self.count_fetches() as fetch:
+            self.assertIsNone(Google.validate(forged))
+        fetch.assert_not_called()
+        self.assertIsNotNone(Google.validate(self.sign()))
+
+
+class AudienceTests(IssuerTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        audiences.metrics.reset()
+        override = override_settings(APPLE_BUNDLE_ID='com.example.app', SOCIAL_AUDIENCES={
+            'google': [{'audience': 'android-client', 'name': 'android', 'rate_limit': '2/min'}],
+            'apple': [{'audience': 'com.example.whitelabel'}],
+        })
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def login(self, provider, audience, sub):
+        token = self.issuer.mint(provider, audience, sub, f'{sub}@example.com')
+        return self.client.post(f'/api/auth/{provider}/', {'auth_token': token}, format='json')
+
+    def test_every_configured_audience_is_accepted(self):
+        self.assertEqual(self.login('google', settings.GOOGLE_CLIENT_ID, 'g-web').status_code, status.HTTP_200_OK)
+        self.assertEqual(self.login('google', 'android-client', 'g-android').status_code, status.HTTP_200_OK)
+        self.assertEqual(self.login('apple', 'com.example.whitelabel', 'a-wl').status_code, status.HTTP_200_OK)
+        self.assertEqual(self.login('google', 'com.example.app', 'g-x').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(audiences.metrics.snapshot(), {
+            'google:web': {'verified': 1},
+            'google:android': {'verified': 1},
+            'apple:com.example.whitelabel': {'verified': 1},
+            'google:(unverified)': {'rejected': 1},
+        })
+
+    def test_rate_budget_is_per_audience(self):
+        for i in range(2):
+            self.assertEqual(self.login('google', 'android-client', f'g-{i}').status_code, status.HTTP_200_OK)
+        response = self.login('google', 'android-client', 'g-2')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(self.login('google', settings.GOOGLE_CLIENT_ID, 'g-3').status_code, status.HTTP_200_OK)
+        self.assertEqual(audiences.metrics.snapshot()['google:android'], {'verified': 2, 'throttled': 1})
+
+    def test_primary_audience_follows_settings(self):
+        with self.settings(GOOGLE_CLIENT_ID='rotated-web-client'):
+            self.assertEqual(self.login('google', 'rotated-web-client', 'g-new').status_code, status.HTTP_200_OK)
+            self.assertEqual(self.login('google', 'android-client', 'g-a').status_code, status.HTTP_200_OK)
+        self.assertEqual(self.login('google', 'rotated-web-client', 'g-old').status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_extra_entry_overrides_primary_defaults(self):
+        with self.settings(SOCIAL_AUDIENCES={'google': [{'audience': settings.GOOGLE_CLIENT_ID, 'rate_limit': '1/min'}]}):
+            self.assertEqual(self.login('google', settings.GOOGLE_CLIENT_ID, 'g-1').status_code, status.HTTP_200_OK)
+            response = self.login('google', settings.GOOGLE_CLIENT_ID, 'g-2')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_duplicate_audience_is_a_configuration_error(self):
+        with self.assertRaises(ImproperlyConfigured):
+            audiences.AudienceRegistry({'google': [{'audience': 'a'}, {'audience': 'a', 'name': 'b'}]})
+
+
+class LoadTestHelperTests(SimpleTestCase):
+    def test_saturation_point(self):
+        steps = [
+            {'concurrency': 1, 'throughput': 10},
+            {'concurrency': 2, 'throughput': 19},
+            {'concurrency': 4, 'throughput': 20},
+        ]
+        self.assertEqual(saturation_point(steps), 2)
+        self.assertIsNone(saturation_point(steps[:2]))
+
+
+class ScopedMiddlewareTests(APITestCase):
+    def test_api_routes_skip_session_stack(self):
+        response = self.client.post('/api/auth/login/', {}, format='json', HTTP_X_REQUEST_ID='abc-123')
+        self.assertEqual(response['X-Request-ID'], 'abc-123')
+        self.assertFalse(hasattr(response.wsgi_request, 'session'))
+        self.assertNotIn('X-Frame-Options', response)
+
+    def test_api_routes_validate_host(self):
+        for path in ('/api/auth/login/', '/.well-known/jwks.json'):
+            response = self.client.get(path, HTTP_HOST='evil.example')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get('/.well-known/jwks.json').status_code, status.HTTP_200_OK)
+
+    def test_admin_keeps_session_stack(self):
+        response = self.client.get('/admin/login/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(hasattr(response.wsgi_request, 'session'))
+        self.assertIn('csrftoken', response.cookies)
+        self.assertIn('X-Request-ID', response)
+
+
+@override_settings(TRACING={'ENABLED': True, 'SAMPLE_RATE': 1.0, 'SINK': 'backend.tracing.InMemorySink'})
+class TracingTests(IssuerTestCase):
+    def setUp(self):
+        super().setUp()
+        reset_processor()
+        self.addCleanup(reset_processor)
+
+    def finished_spans(self):
+        processor = get_processor()
+        processor.force_flush()
+        return {s.name: s for s in processor.sink.spans}
+
+    def test_google_login_phases_are_nested(self):
+        token = self.issuer.mint('google', settings.GOOGLE_CLIENT_ID, 'g-1', 'g1@example.com')
+        self.client.post('/api/auth/google/', {'auth_token': token}, format='json')
+        spans = self.finished_spans()
+        root = spans['POST /api/auth/google/']
+        self.assertIsNone(root.parent_id)
+        self.assertEqual(spans['google.verify'].parent_id, root.span_id)
+        self.assertEqual(spans['google.fetch_certs'].parent_id, spans['google.verify'].span_id)
+        self.assertEqual(spans['db.register_social_user'].parent_id, root.span_id)
+        self.assertEqual(spans['token.mint'].parent_id, root.span_id)
+        self.assertEqual({s.trace_id for s in spans.values()}, {root.trace_id})
+
+    def test_incoming_traceparent_is_continued(self):
+        trace_id, parent_id = 'ab' * 16, 'cd' * 8
+        response = self.client.post(
+            '/api/auth/login/', {}, format='json', HTTP_TRACEPARENT=f'00-{trace_id}-{parent_id}-01',
+        )
+        root = self.finished_spans()['POST /api/auth/login/']
+        self.assertEqual(root.trace_id, trace_id)
+        self.assertEqual(root.parent_id, parent_id)
+        self.assertTrue(response['traceparent'].startswith(f'00-{trace_id}-'))
+
+    @override_settings(TRACING={
+        'ENABLED': True, 'SAMPLE_RATE': 1.0, 'SINK': 'backend.tracing.InMemorySink', 'TRUST_INCOMING_SAMPLED': True,
+    })
+    def test_trusted_unsampled_parent_records_nothing(self):
+        self.client.post(
+            '/api/auth/login/', {}, format='json', HTTP_TRACEPARENT=f'00-{"ab" * 16}-{"cd" * 8}-00',
+        )
+        self.assertEqual(self.finished_spans(), {})
+
+    @override_settings(TRACING={'ENABLED': True, 'SAMPLE_RATE': 0.0, 'SINK': 'backend.tracing.InMemorySink'})
+    def test_client_cannot_force_sampling(self):
+        self.client.post(
+            '/api/auth/login/', {}, format='json', HTTP_TRACEPARENT=f'00-{"ab" * 16}-{"cd" * 8}-01',
+        )
+        self.assertEqual(self.finished_spans(), {})
+
+
+@override_settings(CACHES=MEMORY_CACHE)
+class MeTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(email='me@example.com', password='Zq8!vorpal-kettle', name='Me')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {mint_tokens(self.user)['access']}")
+
+    def test_conditional_get_skips_database(self):
+        response = self.client.get('/api/me/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['data']['email'], 'me@example.com')
+        tag = response['ETag']
+        self.assertTrue(tag.startswith('W/'))
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/me/', HTTP_IF_NONE_MATCH=tag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_patch_bumps_version(self):
+        tag = self.client.get('/api/me/')['ETag']
+        # Load the user, then one UPDATE that also bumps the version
+        with self.assertNumQueries(2):
+            response = self.client.patch('/api/me/', {'name': 'Renamed', 'email': 'x@example.com'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], tag)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.name, 'Renamed')
+        self.assertEqual(self.user.email, 'me@example.com')
+        response = self.client.get('/api/me/', HTTP_IF_NONE_MATCH=tag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_concurrent_updates_each_bump_version(self):
+        first, second = CustomUser.objects.get(pk=self.user.pk), CustomUser.objects.get(pk=self.user.pk)
+        user_state.update_profile(first, name='First')
+        user_state.update_profile(second, location='Second')
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.profile_version, first.profile_version + 1)
+        self.assertEqual((self.user.name, self.user.location), ('First', 'Second'))
+
+    def test_unexposed_fields_keep_etag(self):
+        tag = self.client.get('/api/me/')['ETag']
+        self.user.set_password('Zq8!other-kettle')
+        self.user.save(update_fields=['password'])
+        response = self.client.get('/api/me/', HTTP_IF_NONE_MATCH=tag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_delete_invalidates_cached_state(self):
+        self.client.get('/api/me/')
+        self.assertIsNotNone(user_state.get_state(self.user.pk))
+        self.user.delete()
+        response = self.client.get('/api/me/')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivation_invalidates_cached_state(self):
+        tag = self.client.get('/api/me/')['ETag']
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get('/api/me/', HTTP_IF_NONE_MATCH=tag)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class MeConfiguredCacheTests(APITestCase):
+    """Conditional GET against the cache from settings rather than MEMORY_CACHE."""
+
+    def test_conditional_get_costs_one_cache_lookup(self):
+        user = CustomUser.objects.create_user(email='me@example.com', password='Zq8!vorpal-kettle')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {mint_tokens(user)['access']}")
+        tag = self.client.get('/api/me/')['ETag']
+        # The database cache answers from its table; Redis leaves the database alone
+        expected = 1 if isinstance(caches['default'], DatabaseCache) else 0
+        with self.assertNumQueries(expected):
+            response = self.client.get('/api/me/', HTTP_IF_NONE_MATCH=tag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+
+@override_settings(CACHES=MEMORY_CACHE)
+class RefreshTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(email='refresh@example.com', password='Zq8!vorpal-kettle')
+        self.refresh = mint_tokens(self.user)['refresh']
+
+    def post(self, token):
+        return self.client.post('/api/auth/refresh/', {'refresh': token}, format='json')
+
+    def test_cached_refresh_rotates_without_queries(self):
+        self.assertEqual(self.post(self.refresh).status_code, status.HTTP_200_OK)
+        with self.assertNumQueries(0):
+            response = self.post(self.refresh)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response.data['refresh'], self.refresh)
+        self.assertEqual(self.post(response.data['refresh']).status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            self.client.get('/api/me/', HTTP_AUTHORIZATION=f"Bearer {response.data['access']}").status_code,
+            status.HTTP_200_OK,
+        )
+
+    def test_deactivated_user_cannot_refresh(self):
+        self.assertEqual(self.post(self.refresh).status_code, status.HTTP_200_OK)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.post(self.refresh).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_invalid_token_is_rejected(self):
+        self.assertEqual(self.post(self.refresh[:-2] + 'xx').status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+@override_settings(CACHES=MEMORY_CACHE)
+class BulkUserTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.users = [
+            CustomUser.objects.create_user(email=f'bulk{i}@example.com', password='Zq8!vorpal-kettle')
+            for i in range(5)
+        ]
+        self.tokens = [mint_tokens(user) for user in self.users]
+
+    def get_me(self, index):
+        return self.client.get('/api/me/', HTTP_AUTHORIZATION=f"Bearer {self.tokens[index]['access']}")
+
+    def test_deactivate_revokes_access_and_refresh_tokens(self):
+        self.assertEqual(self.get_me(0).status_code, status.HTTP_200_OK)
+        ids = [user.pk for user in self.users[:3]]
+        # One UPDATE per chunk of two, each in its own savepoint
+        with self.assertNumQueries(6):
+            self.assertEqual(bulk.deactivate_users(ids, chunk_size=2), 3)
+        self.assertEqual(CustomUser.objects.filter(is_active=False).count(), 3)
+        self.assertEqual(self.get_me(0).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.get_me(3).status_code, status.HTTP_200_OK)
+        response = self.client.post('/api/auth/refresh/', {'refresh': self.tokens[0]['refresh']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_revoke_keeps_account_but_rejects_old_tokens(self):
+        bulk.revoke_tokens([self.users[0].pk])
+        self.assertEqual(self.get_me(0).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertTrue(CustomUser.objects.get(pk=self.users[0].pk).is_active)
+
+    def test_delete_in_chunks(self):
+        self.assertEqual(self.get_me(1).status_code, status.HTTP_200_OK)
+        bulk.delete_users([user.pk for user in self.users[:4]], chunk_size=3)
+        self.assertEqual(CustomUser.objects.count(), 1)
+        self.assertEqual(self.get_me(1).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_admin_action_skips_acting_admin(self):
+        admin_user = CustomUser.objects.create_superuser(email='admin@example.com', password='Zq8!vorpal-kettle')
+        self.client.force_login(admin_user)
+        response = self.client.post('/admin/accounts/customuser/', {
+            'action': 'deactivate_and_revoke',
+            'select_across': '1',
+            'index': '0',
+            '_selected_action': [admin_user.pk],
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(CustomUser.objects.filter(is_active=True).get(), admin_user)
+
+
+calls = []
+
+
+@queue.task(name='tests.flaky', max_attempts=2)
+def flaky(fail):
+    calls.append(fail)
+    if fail:
+        raise RuntimeError('boom')
+
+
+class TaskQueueTests(APITestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_idempotency_key_enqueues_once(self):
+        flaky.enqueue(idempotency_key='once', fail=False)
+        flaky.enqueue(idempotency_key='once', fail=False)
+        self.assertEqual(Task.objects.count(), 1)
+        self.assertEqual(queue.run_pending(), 1)
+        self.assertEqual(Task.objects.get().status, Task.SUCCEEDED)
+
+    @override_settings(TASK_QUEUE={'BACKOFF': 0})
+    def test_retries_then_fails(self):
+        task_obj = flaky.enqueue(fail=True)
+        queue.run_pending()
+        task_obj.refresh_from_db()
+        self.assertEqual(task_obj.status, Task.FAILED)
+        self.assertEqual(task_obj.attempts, 2)
+        self.assertIn('boom', task_obj.last_error)
+        self.assertEqual(calls, [True, True])
+
+    def test_failed_attempt_is_rescheduled_with_backoff(self):
+        task_obj = flaky.enqueue(fail=True)
+        queue.run_pending()
+        task_obj.refresh_from_db()
+        self.assertEqual(task_obj.status, Task.PENDING)
+        self.assertGreater(task_obj.run_at, task_obj.created_at)
+        self.assertEqual(queue.run_pending(), 0)
+
+    def test_lost_task_is_not_rerun_past_max_attempts(self):
+        task_obj = queue.build('tests.flaky', {'fail': False}, max_attempts=1)
+        task_obj.save()
+        self.assertEqual([t.pk for t in queue.claim('dead-worker')], [task_obj.pk])
+        Task.objects.filter(pk=task_obj.pk).update(locked_at=timezone.now() - datetime.timedelta(hours=1))
+        self.assertEqual(queue.run_pending(), 0)
+        self.assertEqual(calls, [])
+        task_obj.refresh_from_db()
+        self.assertEqual(task_obj.status, Task.FAILED)
+        self.assertEqual(task_obj.last_error, 'Worker lost')
+
+    def test_prune_deletes_only_old_finished_tasks(self):
+        now = timezone.now()
+        old = now - datetime.timedelta(days=8)
+        for task_status, finished_at in [
+            (Task.SUCCEEDED, old), (Task.FAILED, old), (Task.SUCCEEDED, now), (Task.PENDING, None),
+        ]:
+            Task.objects.create(
+                name='tests.flaky', payload={}, status=task_status, finished_at=finished_at, max_attempts=1,
+            )
+        self.assertEqual(queue.prune(), 2)
+        self.assertEqual(
+            sorted(Task.objects.values_list('status', flat=True)), sorted([Task.SUCCEEDED, Task.PENDING]),
+        )
+        with self.settings(TASK_QUEUE={'RETENTION': None}):
+            self.assertEqual(queue.prune(now + datetime.timedelta(days=30)), 0)
+
+    def test_signup_queues_welcome_email(self):
+        self.client.post('/api/auth/signup/', RegisterTests.payload, format='json')
+        self.assertEqual(len(mail.outbox), 0)
+        queue.autodiscover()
+        queue.run_pending()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['new@example.com'])
+
+
+@override_settings(PASSWORD_HASH_ITERATIONS=1000)
+class PasswordHasherTests(APITestCase):
+    credentials = {'email': 'hash@example.com', 'password': 'S3cure-pass!'}
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(**self.credentials)
+
+    def test_work_factor_comes_from_settings(self):
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$1000$'))
+
+    @override_settings(PASSWORD_HASH_ITERATIONS=2000)
+    def test_login_rehashes_with_current_work_factor(self):
+        response = self.client.post('/api/auth/login/', self.credentials, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$2000$'))
+        self.assertTrue(self.user.check_password(self.credentials['password']))
+
+    def test_login_verifies_the_password_once(self):
+        with mock.patch.object(
+            TunablePBKDF2PasswordHasher, 'verify', autospec=True, side_effect=TunablePBKDF2PasswordHasher.verify,
+        ) as verify:
+            response = self.client.post('/api/auth/login/', self.credentials, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('access', response.data['data'])
+        self.assertEqual(verify.call_count, 1)
+
+    def test_tune_hasher_recommends_a_work_factor(self):
+        out = StringIO()
+        call_command('tune_hasher', target_ms=5, samples=1, stdout=out)
+        self.assertRegex(out.getvalue(), r'PASSWORD_HASH_ITERATIONS=\d+')
+
+    def test_tune_hasher_never_recommends_below_minimum(self):
+        out = StringIO()
+        with mock.patch('accounts.management.commands.tune_hasher.recommend_iterations', return_value=1000):
+            call_command('tune_hasher', target_ms=5, samples=1, stdout=out)
+        self.assertIn(f'PASSWORD_HASH_ITERATIONS={MIN_ITERATIONS} ', out.getvalue())
+
+
+class KeyRingTests(APITestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.directory = tmp.name
+        override = override_settings(JWT_KEY_RING={'DIRECTORY': self.directory, 'ALGORITHM': 'ES256'})
+        override.enable()
+        self.addCleanup(override.disable)
+        keyring.reset()
+        self.addCleanup(keyring.reset)
+        self.user = CustomUser.objects.create_user(email='ring@example.com', password='Zq8!vorpal-kettle')
+
+    def rotate(self, **kwargs):
+        result = keyring.rotate(**kwargs)
+        keyring.reset()
+        return result
+
+    def test_tokens_are_signed_by_kid_and_verifiable_from_jwks(self):
+        self.assertEqual(self.client.get('/.well-known/jwks.json').json(), {'keys': []})
+        kid, _ = self.rotate()
+        access = mint_tokens(self.user)['access']
+        self.assertEqual(pyjwt.get_unverified_header(access), {'alg': 'ES256', 'kid': kid, 'typ': 'JWT'})
+        self.assertEqual(
+            self.client.get('/api/me/', HTTP_AUTHORIZATION=f'Bearer {access}').status_code, status.HTTP_200_OK,
+        )
+
+        response = self.client.get('/.well-known/jwks.json')
+        self.assertIn('max-age=86400', response['Cache-Control'])
+        self.assertIn('public', response['Cache-Control'])
+        # What a downstream service does: verify with the published key alone
+        public_key = pyjwt.PyJWKSet.from_dict(response.json())[kid].key
+        self.assertEqual(pyjwt.decode(access, public_key, algorithms=['ES256'])['user_id'], str(self.user.pk))
+
+        cached = self.client.get('/.well-known/jwks.json', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_successor_is_published_before_it_signs(self):
+        now = int(time.time())
+        first, _ = self.rotate(now=now)
+        self.assertEqual(self.rotate(now=now + 3600), (None, []))
+        second, _ = self.rotate(force=True, now=now)
+        ring = keyring.get_ring()
+        self.assertEqual(set(ring.keys), {first, second})
+        self.assertEqual(ring.signing_key(now).kid, first)
+        self.assertEqual(ring.signing_key(now + 2 * 24 * 3600).kid, second)
+        # The old key outlives the last refresh token it signed, then is deleted
+        expires = ring.keys[first].expires_at
+        self.assertEqual(expires, now + 2 * 24 * 3600 + 7 * 24 * 3600)
+        self.assertEqual(self.rotate(now=expires), (None, [first]))
+        self.assertEqual(set(keyring.get_ring().keys), {second})
+
+    def test_legacy_hs256_tokens_during_migration(self):
+        legacy = mint_tokens(self.user)['access']
+        self.rotate()
+        self.assertEqual(
+            self.client.get('/api/me/', HTTP_AUTHORIZATION=f'Bearer {legacy}').status_code, status.HTTP_200_OK,
+        )
+        with self.settings(JWT_KEY_RING={'DIRECTORY': self.directory, 'ACCEPT_LEGACY_HS256': False}):
+            self.assertEqual(
+                self.client.get('/api/me/', HTTP_AUTHORIZATION=f'Bearer {legacy}').status_code,
+                status.HTTP_401_UNAUTHORIZED,
+            )
@@ -0,0 +1,68 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import F
+
+CACHE_TIMEOUT = getattr(settings, 'USER_STATE_CACHE_TIMEOUT', 300)
+
+
+def _key(user_id):
+    return f'accounts:user-state:{user_id}'
+
+
+def _state(version, is_active, tokens_valid_after):
+    return {
+        'version': version,
+        'is_active': is_active,
+        # Epoch seconds; tokens with an earlier `iat` are revoked
+        'tokens_valid_after': int(tokens_valid_after.timestamp()) if tokens_valid_after else 0,
+    }
+
+
+def get_state(user_id):
+    """Cached ``{'version', 'is_active', 'tokens_valid_after'}`` for a user, or None on a miss."""
+    return cache.get(_key(user_id))
+
+
+def store_state(user):
+    state = _state(user.profile_version, user.is_active, user.tokens_valid_after)
+    cache.set(_key(user.pk), state, CACHE_TIMEOUT)
+    return state
+
+
+def get_or_load_state(user_id):
+    """Cached state, loading it with a single narrow query on a miss. None if the user is gone."""
+    state = get_state(user_id)
+    if state is not None:
+        return state
+    row = (
+        get_user_model().objects.filter(pk=user_id)
+        .values_list('profile_version', 'is_active', 'tokens_valid_after')
+        .first()
+    )
+    if row is None:
+        return None
+    state = _state(*row)
+    cache.set(_key(user_id), state, CACHE_TIMEOUT)
+    return state
+
+
+def invalidate(*user_ids):
+    cache.delete_many([_key(user_id) for user_id in user_ids])
+
+
+def update_profile(user, **fields):
+    """Write ``fields`` and bump ``profile_version`` in a single UPDATE.
+
+    The increment happens in SQL, so concurrent writers never reuse a version;
+    ``user`` is updated in memory instead of being read back.
+    """
+    get_user_model().objects.filter(pk=user.pk).update(profile_version=F('profile_version') + 1, **fields)
+    for field, value in fields.items():
+        setattr(user, field, value)
+    user.profile_version += 1
+    invalidate(user.pk)
+
+
+def etag(user_id, version):
+    return f'W/"{user_id}-{version}"'
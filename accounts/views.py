@@ -1,18 +1,31 @@
 from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.generics import GenericAPIView
-from rest_framework_simplejwt.views import TokenObtainPairView
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from drf_spectacular.utils import extend_schema, OpenApiResponse, OpenApiExample
-from rest_framework_simplejwt.tokens import RefreshToken
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags
+from django.views.decorators.http import require_safe
 from .serializers import (
     GoogleSocialAuthSerializer,
     EmailTokenObtainPairSerializer,
     RegisterSerializer,
     TokenResponseSerializer, 
-    AppleSocialAuthSerializer
+    AppleSocialAuthSerializer,
+    MeSerializer,
+    RevocableTokenRefreshSerializer,
+    mint_tokens,
 )
+from .authentication import CachedStateJWTAuthentication
+from .tasks import enqueue_login_side_effects
+from backend.tracing import span
+from . import keyring, user_state
+
+User = get_user_model()
 
 class APIResponse(Response):
     def __init__(self, data=None, message=None, error=None, status=None):
@@ -193,12 +206,11 @@ class EmailTokenObtainPairView(TokenObtainPairView):
     def post(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         if serializer.is_valid():
-            response_data = super().post(request, *args, **kwargs).data
-            response_data['userId'] = serializer.user.id
-            response_data['user'] = {
-                'email': serializer.user.email,
-                'name': serializer.user.name,
-            }
+            # validated_data already carries the tokens and user; validating again
+            # through super().post() would hash the password a second time
+            response_data = serializer.validated_data
+            with span('tasks.enqueue'):
+                enqueue_login_side_effects(serializer.user, 'email')
             return APIResponse(data=response_data, message="Login successful", status=status.HTTP_200_OK)
         return APIResponse(error=serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -254,8 +266,13 @@ class RegisterView(APIView):
     def post(self, request):
         serializer = RegisterSerializer(data=request.data)
         if serializer.is_valid():
-            user = serializer.save()
-            refresh = RefreshToken.for_user(user)
+            try:
+                user = serializer.save()
+            except ValidationError as e:
+                return APIResponse(error=e.detail, status=status.HTTP_400_BAD_REQUEST)
+            # The saved instance already carries its id; no need to re-read it
+            with span('tasks.enqueue'):
+                enqueue_login_side_effects(user, 'email', created=True)
             data = {
                 'userId': user.id,
                 'user': {
@@ -264,12 +281,131 @@ class RegisterView(APIView):
                     'phone_number': user.phone_number,
                     'location': user.location,
                 },
-                'access': str(refresh.access_token),
-                'refresh': str(refresh),
+                **mint_tokens(user),
             }
             return APIResponse(
                 data=data,
                 message="User created successfully",
                 status=status.HTTP_201_CREATED
             )
-        return APIResponse(error=serializer.errors, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        return APIResponse(error=serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class RevocableTokenRefreshView(TokenRefreshView):
+    serializer_class = RevocableTokenRefreshSerializer
+
+
+class MeView(APIView):
+    # The token alone identifies the user, so a conditional GET whose version is
+    # cached is answered without a database query.
+    authentication_classes = [CachedStateJWTAuthentication]
+
+    @staticmethod
+    def _if_none_match(request):
+        header = request.META.get('HTTP_IF_NONE_MATCH', '')
+        return {tag.strip().removeprefix('W/') for tag in header.split(',') if tag.strip()}
+
+    @staticmethod
+    def _with_validators(response, tag):
+        response['ETag'] = tag
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ['Authorization'])
+        return response
+
+    def _not_modified(self, tag):
+        return self._with_validators(Response(status=status.HTTP_304_NOT_MODIFIED), tag)
+
+    def _profile(self, user, message):
+        response = APIResponse(data=MeSerializer(user).data, message=message, status=status.HTTP_200_OK)
+        return self._with_validators(response, user_state.etag(user.pk, user.profile_version))
+
+    def _load_user(self, request):
+        return User.objects.filter(pk=request.user.id, is_active=True).first()
+
+    def _inactive(self):
+        return APIResponse(
+            error={'detail': 'User not found or inactive.'}, status=status.HTTP_404_NOT_FOUND
+        )
+
+    @extend_schema(
+        responses={
+            200: OpenApiResponse(
+                response=TokenResponseSerializer,
+                description="Current user's profile, with a weak ETag",
+                examples=[
+                    OpenApiExample(
+                        name="SuccessExample",
+                        value={
+                            "status": "success",
+                            "message": "Profile retrieved",
+                            "data": {
+                                "id": 0,
+                                "email": "string",
+                                "name": "string",
+                                "phone_number": "string",
+                                "location": "string",
+                                "auth_provider": "email"
+                            },
+                            "error": None
+                        }
+                    )
+                ]
+            ),
+            304: OpenApiResponse(description="Profile unchanged since the ETag in If-None-Match"),
+        },
+        description="Get the authenticated user's profile. Send If-None-Match to revalidate cheaply."
+    )
+    def get(self, request):
+        tags = self._if_none_match(request)
+        if tags:
+            state = getattr(request.user, 'cached_state', None) or user_state.get_state(request.user.id)
+            if state is not None and state['is_active']:
+                tag = user_state.etag(request.user.id, state['version'])
+                if '*' in tags or tag.removeprefix('W/') in tags:
+                    return self._not_modified(tag)
+        user = self._load_user(request)
+        if user is None:
+            return self._inactive()
+        user_state.store_state(user)
+        tag = user_state.etag(user.pk, user.profile_version)
+        if '*' in tags or tag.removeprefix('W/') in tags:
+            return self._not_modified(tag)
+        return self._profile(user, "Profile retrieved")
+
+    @extend_schema(
+        request=MeSerializer,
+        responses={
+            200: OpenApiResponse(response=TokenResponseSerializer, description="Profile updated"),
+            400: OpenApiResponse(response=TokenResponseSerializer, description="Validation errors"),
+        },
+        description="Partially update the authenticated user's name, phone number or location"
+    )
+    def patch(self, request):
+        user = self._load_user(request)
+        if user is None:
+            return self._inactive()
+        serializer = MeSerializer(user, data=request.data, partial=True)
+        if not serializer.is_valid():
+            return APIResponse(error=serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        changed = [
+            field for field, value in serializer.validated_data.items()
+            if getattr(user, field) != value
+        ]
+        if changed:
+            user_state.update_profile(user, **{field: serializer.validated_data[field] for field in changed})
+        else:
+            user_state.store_state(user)
+        return self._profile(user, "Profile updated")
+
+
+@require_safe
+def jwks(request):
+    """Public keys of the JWT key ring, for services that verify our tokens themselves."""
+    ring = keyring.get_ring()
+    if ring.etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(ring.jwks, content_type='application/json')
+    response['ETag'] = ring.etag
+    patch_cache_control(response, public=True, max_age=keyring.get_config()['JWKS_MAX_AGE'])
+    return response
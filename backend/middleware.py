@@ -0,0 +1,167 @@
+import logging
+import re
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.core.handlers.exception import convert_exception_to_response
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+class MiddlewareChain:
+    """A middleware stack built the same way Django builds ``settings.MIDDLEWARE``.
+
+    The view, template-response and exception hooks are collected so the
+    dispatcher can forward them for requests routed through this chain.
+    """
+
+    def __init__(self, middleware_paths, get_response):
+        self.view_middleware = []
+        self.template_response_middleware = []
+        self.exception_middleware = []
+
+        handler = get_response
+        for middleware_path in reversed(middleware_paths):
+            middleware = import_string(middleware_path)
+            try:
+                mw_instance = middleware(handler)
+            except MiddlewareNotUsed:
+                continue
+            if mw_instance is None:
+                raise ImproperlyConfigured(f"Middleware factory {middleware_path} returned None.")
+            if hasattr(mw_instance, 'process_view'):
+                self.view_middleware.insert(0, mw_instance.process_view)
+            if hasattr(mw_instance, 'process_template_response'):
+                self.template_response_middleware.append(mw_instance.process_template_response)
+            if hasattr(mw_instance, 'process_exception'):
+                self.exception_middleware.append(mw_instance.process_exception)
+            handler = convert_exception_to_response(mw_instance)
+        self.handler = handler
+
+    def __call__(self, request):
+        return self.handler(request)
+
+
+class PathScopedMiddleware:
+    """Run a different middleware chain depending on the request path.
+
+    ``settings.MIDDLEWARE_BY_PATH`` is a list of ``(prefix, middleware)`` pairs;
+    the first prefix that matches ``request.path_info`` wins and anything else
+    runs ``settings.DEFAULT_MIDDLEWARE``. This keeps session, CSRF, auth and
+    message middleware on the admin and docs while JWT-only API routes skip them.
+    """
+
+    def __init__(self, get_response):
+        chains = {}
+
+        def build(paths):
+            key = tuple(paths)
+            if key not in chains:
+                chains[key] = MiddlewareChain(paths, get_response)
+            return chains[key]
+
+        self.scopes = [(prefix, build(paths)) for prefix, paths in settings.MIDDLEWARE_BY_PATH]
+        self.default = build(settings.DEFAULT_MIDDLEWARE)
+
+    def chain_for(self, path):
+        for prefix, chain in self.scopes:
+            if path.startswith(prefix):
+                return chain
+        return self.default
+
+    def __call__(self, request):
+        request._middleware_chain = chain = self.chain_for(request.path_info)
+        return chain(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        for process_view in request._middleware_chain.view_middleware:
+            response = process_view(request, view_func, view_args, view_kwargs)
+            if response is not None:
+                return response
+        return None
+
+    def process_template_response(self, request, response):
+        for process_template_response in request._middleware_chain.template_response_middleware:
+            response = process_template_response(request, response)
+        return response
+
+    def process_exception(self, request, exception):
+        for process_exception in request._middleware_chain.exception_middleware:
+            response = process_exception(request, exception)
+            if response is not None:
+                return response
+        return None
+
+
+class HostValidationMiddleware:
+    """Reject hosts outside ``ALLOWED_HOSTS`` with a 400, as CommonMiddleware does for the full stack."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        # Raises DisallowedHost, which the handler turns into a 400
+        request.get_host()
+        return self.get_response(request)
+
+
+class RequestIDMiddleware:
+    """Tag each request with an id, reusing a well-formed incoming ``X-Request-ID``."""
+
+    header = 'HTTP_X_REQUEST_ID'
+    valid_id = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request_id = request.META.get(self.header, '')
+        if not self.valid_id.match(request_id):
+            request_id = uuid.uuid4().hex
+        request.request_id = request_id
+        response = self.get_response(request)
+        response['X-Request-ID'] = request_id
+        return response
+
+
+class RequestMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+
+    def record(self, status_code, duration):
+        key = f'{status_code // 100}xx'
+        with self._lock:
+            count, total = self._counters.get(key, (0, 0.0))
+            self._counters[key] = (count + 1, total + duration)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                key: {'count': count, 'avg_ms': total / count * 1000}
+                for key, (count, total) in self._counters.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+
+
+metrics = RequestMetrics()
+
+
+class MetricsMiddleware:
+    """Count requests and accumulate latency per status class in-process."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        response = self.get_response(request)
+        metrics.record(response.status_code, time.perf_counter() - start)
+        return response
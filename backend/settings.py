@@ -11,7 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
-from decouple import config
+from decouple import Csv, config
 from datetime import timedelta
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -42,8 +42,17 @@ INSTALLED_APPS = [
     'accounts',
 ]
 
+# Middleware is chosen per path by PathScopedMiddleware (backend/middleware.py).
 MIDDLEWARE = [
+    'backend.middleware.PathScopedMiddleware',
+]
+
+# Full session stack, needed by the admin and the browsable docs
+DEFAULT_MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'backend.middleware.RequestIDMiddleware',
+    'backend.tracing.TracingMiddleware',
+    'backend.middleware.MetricsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -52,6 +61,27 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# JWT-only API routes: no sessions, CSRF, lazy users or messages
+API_MIDDLEWARE = [
+    'backend.middleware.HostValidationMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'backend.middleware.RequestIDMiddleware',
+    'backend.tracing.TracingMiddleware',
+    'backend.middleware.MetricsMiddleware',
+]
+
+# First matching prefix wins; unmatched paths use DEFAULT_MIDDLEWARE
+MIDDLEWARE_BY_PATH = [
+    ('/api/docs/', DEFAULT_MIDDLEWARE),
+    ('/api/redoc/', DEFAULT_MIDDLEWARE),
+    ('/api/schema/', DEFAULT_MIDDLEWARE),
+    ('/api/', API_MIDDLEWARE),
+    ('/.well-known/', API_MIDDLEWARE),
+]
+
+# The admin checks only look at MIDDLEWARE; DEFAULT_MIDDLEWARE provides what they require
+SILENCED_SYSTEM_CHECKS = ['admin.E408', 'admin.E409', 'admin.E410']
+
 ROOT_URLCONF = 'backend.urls'
 
 TEMPLATES = [
@@ -82,9 +112,33 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Revocation (cached user state), login budgets and throttles must be seen by every
+# process, so never fall back to the per-process LocMemCache. Use Redis in production
+# (`pip install redis`); without REDIS_URL the database cache is shared instead, and
+# every cache lookup (e.g. a 304 from /api/me/) becomes a query on its table.
+REDIS_URL = config('REDIS_URL', default='')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'accounts_cache',
+            'OPTIONS': {'MAX_ENTRIES': 100_000},
+        }
+    }
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.RevocableJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -98,13 +152,96 @@ SIMPLE_JWT = {
     'ROTATE_REFRESH_TOKENS': True,
 }
 
+# Asymmetric signing (accounts/keyring.py). Until `manage.py rotate_signing_keys` has
+# created a key in JWT_KEY_DIR, tokens keep being signed with HS256 and SECRET_KEY.
+JWT_KEY_RING = {
+    'DIRECTORY': config('JWT_KEY_DIR', default=str(BASE_DIR / 'jwt_keys')),
+    'ALGORITHM': config('JWT_SIGNING_ALGORITHM', default='ES256'),
+    'ROTATION_INTERVAL': 30 * 24 * 3600,
+    'PUBLISH_AHEAD': 2 * 24 * 3600,
+    'JWKS_MAX_AGE': 24 * 3600,
+    'ACCEPT_LEGACY_HS256': config('JWT_ACCEPT_LEGACY_HS256', default=True, cast=bool),
+}
+
 GOOGLE_CLIENT_ID = config('GOOGLE_CLIENT_ID')
+APPLE_BUNDLE_ID = config('APPLE_BUNDLE_ID', default='')
+
+# Clients besides GOOGLE_CLIENT_ID and APPLE_BUNDLE_ID that may sign in through this
+# deployment: Google client IDs and Apple bundle IDs per platform or white-label build.
+# `name` labels metrics; `rate_limit` ('num/period' as in DRF throttling) caps that
+# client's logins across the fleet. An entry naming the primary ID overrides its
+# defaults ('web' for Google, 'ios' for Apple).
+SOCIAL_AUDIENCES = {
+    'google': [{'audience': client_id} for client_id in config('GOOGLE_EXTRA_CLIENT_IDS', default='', cast=Csv())],
+    'apple': [{'audience': bundle_id} for bundle_id in config('APPLE_EXTRA_BUNDLE_IDS', default='', cast=Csv())],
+}
+
+# Key endpoints; only overridden to point at the `loadtest` fake issuer
+GOOGLE_CERTS_URL = config('GOOGLE_CERTS_URL', default='https://www.googleapis.com/oauth2/v1/certs')
+APPLE_JWKS_URL = config('APPLE_JWKS_URL', default='https://appleid.apple.com/auth/keys')
+
+# Request tracing (backend/tracing.py). Incoming `traceparent` headers are
+# honoured; other requests are sampled at SAMPLE_RATE. Use
+# 'backend.tracing.OTLPHTTPSink' with OPTIONS={'endpoint': ...} for a collector.
+TRACING = {
+    # Off unless asked for, so tests and dev servers don't write traces.log
+    'ENABLED': config('TRACING_ENABLED', default=False, cast=bool),
+    'SAMPLE_RATE': config('TRACING_SAMPLE_RATE', default=0.01, cast=float),
+    'TRUST_INCOMING_SAMPLED': config('TRACING_TRUST_TRACEPARENT', default=False, cast=bool),
+    'SINK': 'backend.tracing.LogFileSink',
+    'OPTIONS': {'path': str(BASE_DIR / 'traces.log')},
+    'BATCH_SIZE': 256,
+    'FLUSH_INTERVAL': 5,
+}
+
+# Background tasks (accounts/queue.py), executed by `manage.py run_workers`
+TASK_QUEUE = {
+    'MAX_ATTEMPTS': 5,
+    'BACKOFF': 5,
+    'BACKOFF_MAX': 15 * 60,
+    'VISIBILITY_TIMEOUT': 10 * 60,
+    'RETENTION': 7 * 24 * 3600,
+}
+SYNC_PROFILE_PICTURES = True
+
+EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.console.EmailBackend')
+DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='webmaster@localhost')
+
+# Outbound calls to Google/Apple key endpoints (see accounts/outbound.py)
+PROVIDER_HTTP = {
+    'CONNECT_TIMEOUT': 3.05,
+    'READ_TIMEOUT': 5,
+    'RETRIES': 2,
+    'BACKOFF': 0.2,
+    'BREAKER_THRESHOLD': 5,
+    'BREAKER_RESET': 30,
+    'CACHE_TTL': 3600,
+}
+
+# Cheap rejection of Google/Apple ID tokens before any key lookup (accounts/precheck.py)
+ID_TOKEN_PRECHECK = {
+    'REJECTED_TOKEN_TTL': 60,
+    'UNKNOWN_KID_TTL': 300,
+    'KEY_REFRESH_INTERVAL': 60,
+}
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
 AUTH_USER_MODEL = 'accounts.CustomUser'
 
+# Password hashing. PBKDF2 work factor; run `manage.py tune_hasher` to size it for
+# the host. Hashes with another iteration count are upgraded on the next login.
+PASSWORD_HASH_ITERATIONS = config('PASSWORD_HASH_ITERATIONS', default=1_000_000, cast=int)
+
+PASSWORD_HASHERS = [
+    'accounts.hashers.TunablePBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -0,0 +1,301 @@
+import atexit
+import contextvars
+import json
+import logging
+import random
+import re
+import secrets
+import threading
+import time
+from collections import deque
+
+import requests
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': False,
+    'SAMPLE_RATE': 0.01,
+    # Follow the sampled flag of an incoming traceparent; only enable behind a proxy that sets or strips it
+    'TRUST_INCOMING_SAMPLED': False,
+    'SINK': 'backend.tracing.LogFileSink',
+    'OPTIONS': {},
+    'BATCH_SIZE': 256,
+    'MAX_QUEUE': 4096,
+    'FLUSH_INTERVAL': 5,
+    'SERVICE_NAME': 'django-oauth',
+}
+
+TRACEPARENT = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+
+_current_span = contextvars.ContextVar('current_span', default=None)
+
+
+class Span:
+    __slots__ = ('trace_id', 'span_id', 'parent_id', 'name', 'attributes', 'start_ns', 'end_ns', 'error', '_token')
+
+    def __init__(self, name, trace_id, parent_id=None, attributes=None):
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes or {}
+        self.start_ns = None
+        self.end_ns = None
+        self.error = None
+        self._token = None
+
+    @property
+    def duration_ms(self):
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def __enter__(self):
+        self._token = _current_span.set(self)
+        self.start_ns = time.time_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end_ns = time.time_ns()
+        if exc is not None:
+            self.error = f'{exc_type.__name__}: {exc}'
+        _current_span.reset(self._token)
+        get_processor().on_end(self)
+        return False
+
+    def to_dict(self):
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start_ns': self.start_ns,
+            'end_ns': self.end_ns,
+            'duration_ms': self.duration_ms,
+            'attributes': self.attributes,
+            'error': self.error,
+        }
+
+
+class _NoopSpan:
+    def set_attribute(self, key, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def span(name, **attributes):
+    """Child span of the current sampled span; a shared no-op when there is none."""
+    parent = _current_span.get()
+    if parent is None:
+        return NOOP_SPAN
+    return Span(name, parent.trace_id, parent.span_id, attributes)
+
+
+def current_span():
+    return _current_span.get()
+
+
+def start_trace(name, traceparent=None, **attributes):
+    """Root span for a request, continuing an incoming W3C ``traceparent`` if present.
+
+    The trace is sampled at ``TRACING['SAMPLE_RATE']``; the incoming sampled
+    flag decides instead only with ``TRUST_INCOMING_SAMPLED``, so clients cannot
+    force tracing. Unsampled requests get the no-op span.
+    """
+    conf = get_config()
+    if not conf['ENABLED']:
+        return NOOP_SPAN
+    match = TRACEPARENT.match(traceparent or '')
+    if match:
+        trace_id, parent_id, flags = match.groups()
+    else:
+        trace_id, parent_id, flags = secrets.token_hex(16), None, None
+    if flags is not None and conf['TRUST_INCOMING_SAMPLED']:
+        sampled = int(flags, 16) & 1
+    else:
+        sampled = random.random() < conf['SAMPLE_RATE']
+    if not sampled:
+        return NOOP_SPAN
+    return Span(name, trace_id, parent_id, attributes)
+
+
+class InMemorySink:
+    def __init__(self):
+        self.spans = []
+
+    def export(self, spans):
+        self.spans.extend(spans)
+
+    def clear(self):
+        self.spans.clear()
+
+
+class LogFileSink:
+    """Append finished spans to a file as JSON lines."""
+
+    def __init__(self, path='traces.log'):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, spans):
+        lines = ''.join(json.dumps(s.to_dict()) + '\n' for s in spans)
+        with self._lock, open(self.path, 'a') as f:
+            f.write(lines)
+
+
+class OTLPHTTPSink:
+    """POST spans to an OTLP/HTTP collector using the JSON encoding."""
+
+    def __init__(self, endpoint='http://127.0.0.1:4318/v1/traces', timeout=2, headers=None):
+        self.endpoint = endpoint
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update(headers or {})
+
+    @staticmethod
+    def _attribute(key, value):
+        if isinstance(value, bool):
+            return {'key': key, 'value': {'boolValue': value}}
+        if isinstance(value, int):
+            return {'key': key, 'value': {'intValue': str(value)}}
+        if isinstance(value, float):
+            return {'key': key, 'value': {'doubleValue': value}}
+        return {'key': key, 'value': {'stringValue': str(value)}}
+
+    def _encode(self, spans):
+        encoded = []
+        for s in spans:
+            item = {
+                'traceId': s.trace_id,
+                'spanId': s.span_id,
+                'name': s.name,
+                'startTimeUnixNano': str(s.start_ns),
+                'endTimeUnixNano': str(s.end_ns),
+                'attributes': [self._attribute(k, v) for k, v in s.attributes.items()],
+                'status': {'code': 2, 'message': s.error} if s.error else {},
+            }
+            if s.parent_id:
+                item['parentSpanId'] = s.parent_id
+            encoded.append(item)
+        return {
+            'resourceSpans': [{
+                'resource': {'attributes': [self._attribute('service.name', get_config()['SERVICE_NAME'])]},
+                'scopeSpans': [{'scope': {'name': __name__}, 'spans': encoded}],
+            }]
+        }
+
+    def export(self, spans):
+        try:
+            self.session.post(self.endpoint, json=self._encode(spans), timeout=self.timeout)
+        except requests.RequestException as e:
+            logger.warning(f"Failed to export {len(spans)} spans: {e}")
+
+
+class BatchSpanProcessor:
+    """Queue finished spans and hand them to the sink in batches from a background thread."""
+
+    def __init__(self, sink, batch_size=256, max_queue=4096, flush_interval=5):
+        self.sink = sink
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = deque(maxlen=max_queue)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread = None
+
+    def on_end(self, finished):
+        self._queue.append(finished)
+        if self._thread is None:
+            self._start()
+        if len(self._queue) >= self.batch_size:
+            self._wakeup.set()
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='span-exporter', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stopped:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.force_flush()
+
+    def force_flush(self):
+        while self._queue:
+            batch = []
+            while self._queue and len(batch) < self.batch_size:
+                batch.append(self._queue.popleft())
+            try:
+                self.sink.export(batch)
+            except Exception as e:
+                logger.warning(f"Span sink {type(self.sink).__name__} failed: {e}")
+
+    def shutdown(self):
+        self._stopped = True
+        self._wakeup.set()
+        self.force_flush()
+
+
+_processor = None
+_processor_lock = threading.Lock()
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'TRACING', {})}
+
+
+def get_processor():
+    global _processor
+    if _processor is None:
+        with _processor_lock:
+            if _processor is None:
+                conf = get_config()
+                sink = import_string(conf['SINK'])(**conf['OPTIONS'])
+                _processor = BatchSpanProcessor(
+                    sink, conf['BATCH_SIZE'], conf['MAX_QUEUE'], conf['FLUSH_INTERVAL'],
+                )
+                atexit.register(_processor.shutdown)
+    return _processor
+
+
+def reset_processor():
+    """Drop the configured processor so the next span picks up current settings."""
+    global _processor
+    with _processor_lock:
+        if _processor is not None:
+            _processor.shutdown()
+        _processor = None
+
+
+class TracingMiddleware:
+    """Open a root span per request and propagate the trace id back to the client."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with start_trace(
+            f'{request.method} {request.path_info}',
+            request.META.get('HTTP_TRACEPARENT'),
+            **{'http.method': request.method, 'http.route': request.path_info},
+        ) as root:
+            response = self.get_response(request)
+            if isinstance(root, Span):
+                root.set_attribute('http.status_code', response.status_code)
+                response['traceparent'] = f'00-{root.trace_id}-{root.span_id}-01'
+            return response
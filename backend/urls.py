@@ -21,6 +21,8 @@ from django.conf import settings
 from django.shortcuts import redirect
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView, SpectacularRedocView
 
+from accounts.views import jwks
+
 
 def redirect_to_docs(request):
     return redirect('swagger-ui')
@@ -29,6 +31,7 @@ urlpatterns = [
     path('', redirect_to_docs),
     path('admin/', admin.site.urls),
     path('api/', include('accounts.urls')),
+    path('.well-known/jwks.json', jwks, name='jwks'),
 
     path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
     path('api/docs/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),